@@ -1,69 +1,228 @@
+import importlib.util
 import os
-import ssl
-from datetime import datetime, timedelta
+import logging
+import subprocess
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
 
-def get_ssl_context(cert_file="cert.pem", key_file="key.pem"):
+# Set up logging
+logger = logging.getLogger("BackendBuddy.Certs")
+
+# Certs live next to this module so the working directory doesn't matter
+CERT_DIR = os.path.dirname(os.path.abspath(__file__))
+CERT_VALIDITY = timedelta(days=365)
+CERT_RENEW_MARGIN = timedelta(days=7)
+# Forward-secret AEAD suites only (TLS 1.3 suites are configured separately by OpenSSL)
+SSL_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20"
+
+# In-process cache of a validated pair's not_valid_after (None if unknown), keyed by absolute (cert, key) paths
+_EXPIRY_CACHE: dict = {}
+_CERT_LOCK = threading.Lock()
+
+# Probed once at import without loading the package; submodules are imported on first use
+_HAS_CRYPTO = importlib.util.find_spec("cryptography") is not None
+_crypto_mods = None
+
+
+def _load_crypto():
+    """Import and memoize the cryptography submodules used for cert generation"""
+    global _crypto_mods
+    if _crypto_mods is None:
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives import hashes, serialization
+        _crypto_mods = (x509, NameOID, ec, hashes, serialization)
+    return _crypto_mods
+
+
+def get_ssl_context(cert_file=None, key_file=None):
     """
     Ensure self-signed certs exist and return them.
-    If they don't exist, generate them.
+    If they don't exist, or expire within CERT_RENEW_MARGIN, generate them.
+    Results are cached per process so repeated calls skip the stat/keygen work.
     """
-    if not os.path.exists(cert_file) or not os.path.exists(key_file):
-        print(f"Generating self-signed certificate: {cert_file}, {key_file}")
+    cert_file = cert_file or os.path.join(CERT_DIR, "cert.pem")
+    key_file = key_file or os.path.join(CERT_DIR, "key.pem")
+    cache_key = (os.path.abspath(cert_file), os.path.abspath(key_file))
+    if cache_key in _EXPIRY_CACHE and not _is_expiring(_EXPIRY_CACHE[cache_key]):
+        return cert_file, key_file
+
+    with _CERT_LOCK:
+        # Another thread may have populated the cache while we waited
+        if cache_key in _EXPIRY_CACHE and not _is_expiring(_EXPIRY_CACHE[cache_key]):
+            return cert_file, key_file
+
         try:
-            from cryptography import x509
-            from cryptography.x509.oid import NameOID
-            from cryptography.hazmat.primitives import hashes
-            from cryptography.hazmat.primitives.asymmetric import rsa
-            from cryptography.hazmat.primitives import serialization
-            
-            # Generate key
-            key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048,
-            )
-            
-            # Generate cert
-            subject = issuer = x509.Name([
-                x509.NameAttribute(NameOID.COMMON_NAME, u"BackendBuddy"),
-            ])
-            
-            cert = x509.CertificateBuilder().subject_name(
-                subject
-            ).issuer_name(
-                issuer
-            ).public_key(
-                key.public_key()
-            ).serial_number(
-                x509.random_serial_number()
-            ).not_valid_before(
-                datetime.utcnow()
-            ).not_valid_after(
-                datetime.utcnow() + timedelta(days=365)
-            ).add_extension(
-                x509.SubjectAlternativeName([x509.DNSName(u"localhost")]),
-                critical=False,
-            ).sign(key, hashes.SHA256())
-            
-            # Write key
-            with open(key_file, "wb") as f:
-                f.write(key.private_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PrivateFormat.TraditionalOpenSSL,
-                    encryption_algorithm=serialization.NoEncryption(),
-                ))
-                
-            # Write cert
-            with open(cert_file, "wb") as f:
-                f.write(cert.public_bytes(serialization.Encoding.PEM))
-                
-            print("Certificate generated successfully.")
-            
-        except ImportError:
-            print("WARNING: 'cryptography' library not found. Cannot generate certs.")
-            print("Please run: pip install cryptography")
-            return None, None
-        except Exception as e:
-            print(f"Error generating certs: {e}")
+            os.stat(cert_file)
+            os.stat(key_file)
+            not_after = _read_not_after(cert_file)
+            needs_new = _is_expiring(not_after)
+            if needs_new:
+                logger.info(f"Certificate {cert_file} expires at {not_after}, regenerating")
+        except FileNotFoundError:
+            needs_new = True
+
+        if needs_new:
+            not_after = _generate_cert(cert_file, key_file)
+            if not not_after:
+                return None, None
+
+        loads = _pair_loads(cert_file, key_file)
+        if not loads and not needs_new:
+            # A crash between the key and cert writes leaves a mismatched pair
+            logger.warning("Existing cert/key pair failed to load, regenerating")
+            not_after = _generate_cert(cert_file, key_file)
+            if not not_after:
+                return None, None
+            loads = _pair_loads(cert_file, key_file)
+        if not loads:
             return None, None
 
+        _EXPIRY_CACHE[cache_key] = not_after
+
     return cert_file, key_file
+
+
+def _pair_loads(cert_file, key_file):
+    """True if the pair loads into a server SSLContext (which is then discarded)"""
+    # Deferred so plain HTTP startups never load OpenSSL
+    import ssl
+    try:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        # Same suites uvicorn is given, so a bad SSL_CIPHERS fails here too
+        ctx.set_ciphers(SSL_CIPHERS)
+        ctx.load_cert_chain(cert_file, key_file)
+        return True
+    except Exception:
+        logger.exception("Error loading certs")
+        return False
+
+
+def _is_expiring(not_after):
+    """True if the cert expiry (aware UTC) falls inside the renewal margin"""
+    return not_after is not None and not_after <= datetime.now(timezone.utc) + CERT_RENEW_MARGIN
+
+
+def _read_not_after(cert_file):
+    """Return the cert's expiry as aware UTC, or None if it can't be checked"""
+    if not _HAS_CRYPTO:
+        return None
+    try:
+        x509 = _load_crypto()[0]
+        with open(cert_file, "rb") as f:
+            cert = x509.load_pem_x509_certificate(f.read())
+    except ValueError as e:
+        # Unparseable cert: treat as expired so it gets replaced
+        logger.warning(f"Could not parse {cert_file}: {e}")
+        return datetime.min.replace(tzinfo=timezone.utc)
+    if cert.signature_algorithm_oid == x509.oid.SignatureAlgorithmOID.ED25519:
+        # Earlier versions wrote Ed25519 certs, which browsers reject for TLS servers
+        logger.info(f"Certificate {cert_file} uses Ed25519, replacing it with ECDSA P-256")
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return _cert_not_after(cert)
+
+
+def _cert_not_after(cert):
+    """not_valid_after as aware UTC across cryptography versions"""
+    not_after = getattr(cert, "not_valid_after_utc", None)
+    if not_after is None:
+        # cryptography < 42 only exposes a naive UTC datetime
+        return cert.not_valid_after.replace(tzinfo=timezone.utc)
+    return not_after
+
+
+def _generate_cert(cert_file, key_file):
+    """Generate a self-signed cert/key pair. Returns its expiry on success, None on failure."""
+    logger.info(f"Generating self-signed certificate: {cert_file}, {key_file}")
+    if not _HAS_CRYPTO:
+        logger.warning("'cryptography' library not found, falling back to the openssl CLI")
+        return _generate_cert_openssl(cert_file, key_file)
+    try:
+        x509, NameOID, ec, hashes, serialization = _load_crypto()
+        
+        # Generate key
+        # ECDSA P-256 keygen is a single scalar multiply, far cheaper than RSA-2048,
+        # and unlike Ed25519 it is accepted by browsers for TLS server certs
+        key = ec.generate_private_key(ec.SECP256R1())
+        
+        # Generate cert
+        subject = issuer = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, u"BackendBuddy"),
+        ])
+        
+        now = datetime.now(timezone.utc)
+        cert = x509.CertificateBuilder().subject_name(
+            subject
+        ).issuer_name(
+            issuer
+        ).public_key(
+            key.public_key()
+        ).serial_number(
+            x509.random_serial_number()
+        ).not_valid_before(
+            now
+        ).not_valid_after(
+            now + CERT_VALIDITY
+        ).add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(u"localhost")]),
+            critical=False,
+        ).sign(key, hashes.SHA256())
+        
+        # Write key, then cert; each lands atomically, and a missing or
+        # mismatched pair is regenerated on the next start
+        _atomic_write(key_file, key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ))
+        _atomic_write(cert_file, cert.public_bytes(serialization.Encoding.PEM))
+            
+        logger.info("Certificate generated successfully")
+        return _cert_not_after(cert)
+        
+    except Exception:
+        logger.exception("Error generating certs")
+        return None
+
+
+def _generate_cert_openssl(cert_file, key_file):
+    """Generate the pair with the openssl CLI. Returns its expiry on success, None on failure."""
+    now = datetime.now(timezone.utc)
+    try:
+        subprocess.run(
+            [
+                "openssl", "req", "-x509",
+                "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                "-keyout", key_file, "-out", cert_file,
+                "-days", str(CERT_VALIDITY.days), "-nodes",
+                "-subj", "/CN=BackendBuddy",
+                "-addext", "subjectAltName=DNS:localhost",
+            ],
+            check=True,
+            capture_output=True,
+            timeout=10,
+        )
+    except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"openssl fallback failed ({e}). Cannot generate certs. Please run: pip install cryptography")
+        return None
+    logger.info("Certificate generated successfully (openssl)")
+    return now + CERT_VALIDITY
+
+
+def _atomic_write(path, data):
+    """Write data to a temp file in the same directory, fsync, then os.replace it into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
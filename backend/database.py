@@ -1,10 +1,13 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
+from sqlalchemy import create_engine, event, inspect, select, text, Column, Integer, String, Boolean, DateTime, Index, CheckConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql import func
 import os
 import logging
 import traceback
+from typing import Optional, List, Dict
 
 # Set up logging
 logger = logging.getLogger("BackendBuddy.Database")
@@ -12,16 +15,47 @@ logger = logging.getLogger("BackendBuddy.Database")
 # Database setup
 DB_PATH = os.path.join(os.path.dirname(__file__), "vibecoding.db")
 DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
 logger.info(f"Database path: {DB_PATH}")
 
+# Bump whenever a migration is added to init_db; stored in PRAGMA user_version
+CURRENT_SCHEMA_VERSION = 6
+
+# SQLAlchemy already pools file-backed SQLite connections (QueuePool, 5 + 10 overflow)
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# Async engine for the async route handlers; the sync engine stays for init_db and threads.
+# aiosqlite defaults to NullPool for files, so its pool is sized explicitly
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=5,
+    max_overflow=10,
+)
+
+
+@event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _):
+    """WAL + relaxed sync: one fsync per checkpoint instead of two per commit"""
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA mmap_size=134217728")
+    cur.close()
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine, future=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
 class ProjectConfig(Base):
     """Single project configuration"""
     __tablename__ = "project_config"
+    __table_args__ = (CheckConstraint("id = 1", name="ck_project_config_singleton"),)
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, default="My Project")
@@ -31,13 +65,13 @@ class ProjectConfig(Base):
     frontend_command = Column(String, nullable=True)
     port = Column(Integer, nullable=True)
     lan_ip = Column(String, nullable=True)
-    lan_enabled = Column(Boolean, default=False)
-    ngrok_enabled = Column(Boolean, default=False)
-    cloudflare_enabled = Column(Boolean, default=False)
-    queue_enabled = Column(Boolean, default=True)
-    max_concurrent_users = Column(Integer, default=1)
-    prioritize_localhost = Column(Boolean, default=True)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    lan_enabled = Column(Boolean, nullable=False, default=False, server_default=text("0"))
+    ngrok_enabled = Column(Boolean, nullable=False, default=False, server_default=text("0"))
+    cloudflare_enabled = Column(Boolean, nullable=False, default=False, server_default=text("0"))
+    queue_enabled = Column(Boolean, nullable=False, default=True, server_default=text("1"))
+    max_concurrent_users = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    prioritize_localhost = Column(Boolean, nullable=False, default=True, server_default=text("1"))
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 
 class QueueEntry(Base):
@@ -46,10 +80,15 @@ class QueueEntry(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, unique=True, index=True)
-    is_active = Column(Boolean, default=False)
-    joined_at = Column(DateTime, default=datetime.utcnow)
-    last_heartbeat = Column(DateTime, default=datetime.utcnow)
+    is_active = Column(Boolean, nullable=False, default=False, server_default=text("0"))
+    joined_at = Column(DateTime, default=func.now())
+    last_heartbeat = Column(DateTime, default=func.now())
     position = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_queue_active_position", "is_active", "position"),
+        Index("ix_queue_heartbeat", "last_heartbeat"),
+    )
 
 
 class ProjectPreset(Base):
@@ -63,7 +102,47 @@ class ProjectPreset(Base):
     frontend_directory = Column(String, nullable=True)
     frontend_command = Column(String, nullable=True)
     port = Column(Integer, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=func.now())
+
+
+# Column migrations for databases created by older versions: (column, statement)
+_MIGRATIONS = [
+    ("cloudflare_enabled", text("ALTER TABLE project_config ADD COLUMN cloudflare_enabled BOOLEAN NOT NULL DEFAULT 0")),
+    ("frontend_directory", text("ALTER TABLE project_config ADD COLUMN frontend_directory VARCHAR")),
+    ("frontend_command", text("ALTER TABLE project_config ADD COLUMN frontend_command VARCHAR")),
+    # Waiting room settings
+    ("max_concurrent_users", text("ALTER TABLE project_config ADD COLUMN max_concurrent_users INTEGER NOT NULL DEFAULT 1")),
+    ("prioritize_localhost", text("ALTER TABLE project_config ADD COLUMN prioritize_localhost BOOLEAN NOT NULL DEFAULT 1")),
+]
+
+# Older tables declared these columns nullable; fill any NULLs with the model defaults
+_BACKFILLS = [
+    text("UPDATE project_config SET lan_enabled = COALESCE(lan_enabled, 0), ngrok_enabled = COALESCE(ngrok_enabled, 0), queue_enabled = COALESCE(queue_enabled, 1)"),
+    text("UPDATE queue_entries SET is_active = COALESCE(is_active, 0)"),
+]
+
+# Seed row for the singleton project config
+_DEFAULT_CONFIG = {
+    "id": 1,
+    "name": "My Project",
+    "directory": "",
+    "command": "",
+    "frontend_directory": "",
+    "frontend_command": "",
+    "port": 8000,
+    "lan_ip": "",
+    "lan_enabled": False,
+    "ngrok_enabled": False,
+    "cloudflare_enabled": False,
+    "queue_enabled": True,
+    "max_concurrent_users": 1,
+    "prioritize_localhost": True,
+}
+
+_INDEXES = [
+    text("CREATE INDEX IF NOT EXISTS ix_queue_active_position ON queue_entries (is_active, position)"),
+    text("CREATE INDEX IF NOT EXISTS ix_queue_heartbeat ON queue_entries (last_heartbeat)"),
+]
 
 
 def init_db():
@@ -73,73 +152,49 @@ def init_db():
         Base.metadata.create_all(bind=engine)
         logger.debug("Database tables created")
         
-        # Migration: Check if cloudflare_enabled exists, if not add it
+        # Migration: add any columns missing from older databases
         try:
-            from sqlalchemy import inspect, text
-            inspector = inspect(engine)
-            columns = [c['name'] for c in inspector.get_columns('project_config')]
-            if 'cloudflare_enabled' not in columns:
-                logger.info("Migrating database: adding cloudflare_enabled column")
-                with engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE project_config ADD COLUMN cloudflare_enabled BOOLEAN DEFAULT 0"))
-                    conn.commit()
-            
-            if 'frontend_directory' not in columns:
-                logger.info("Migrating database: adding frontend_directory column")
-                with engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE project_config ADD COLUMN frontend_directory VARCHAR"))
-                    conn.execute(text("ALTER TABLE project_config ADD COLUMN frontend_command VARCHAR"))
-                    conn.commit()
-
-            # Migration for waiting room settings
-            if 'max_concurrent_users' not in columns:
-                logger.info("Migrating database: adding max_concurrent_users column")
-                with engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE project_config ADD COLUMN max_concurrent_users INTEGER DEFAULT 1"))
-                    conn.commit()
+            with engine.connect() as conn:
+                schema_version = conn.execute(text("PRAGMA user_version")).scalar() or 0
             
-            if 'prioritize_localhost' not in columns:
-                logger.info("Migrating database: adding prioritize_localhost column")
-                with engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE project_config ADD COLUMN prioritize_localhost BOOLEAN DEFAULT 1"))
-                    conn.commit()
+            if schema_version >= CURRENT_SCHEMA_VERSION:
+                logger.debug(f"Schema version {schema_version} is current, skipping migration check")
+            else:
+                inspector = inspect(engine)
+                columns = [c['name'] for c in inspector.get_columns('project_config')]
+                
+                # Collect every missing column first, then apply them in one transaction
+                pending = [(col, stmt) for col, stmt in _MIGRATIONS if col not in columns]
+
+                with engine.begin() as conn:
+                    if pending:
+                        logger.info(f"Migrating database: adding columns {[name for name, _ in pending]}")
+                        for _, stmt in pending:
+                            conn.execute(stmt)
+                    # Indexes on existing tables are not added by create_all
+                    for stmt in _INDEXES + _BACKFILLS:
+                        conn.execute(stmt)
+                    conn.execute(text(f"PRAGMA user_version = {CURRENT_SCHEMA_VERSION}"))
 
-            logger.info("Migration check complete")
+                logger.info("Migration check complete")
         except Exception as e:
             logger.error(f"Migration failed: {e}")
 
-        # Create default project config if none exists
-        db = SessionLocal()
+        # Create default project config if none exists (INSERT OR IGNORE on the singleton id)
         try:
-            config = db.query(ProjectConfig).first()
-            if not config:
-                logger.info("No config found, creating default configuration")
-                config = ProjectConfig(
-                    name="My Project",
-                    directory="",
-                    command="",
-                    frontend_directory="",
-                    frontend_command="",
-                    port=8000,
-                    lan_ip="",
-                    lan_enabled=False,
-                    ngrok_enabled=False,
-                    cloudflare_enabled=False,
-                    queue_enabled=True,
-                    max_concurrent_users=1,
-                    prioritize_localhost=True
+            with engine.begin() as conn:
+                result = conn.execute(
+                    ProjectConfig.__table__.insert().prefix_with("OR IGNORE"),
+                    _DEFAULT_CONFIG,
                 )
-                db.add(config)
-                db.commit()
+            if result.rowcount:
                 logger.info("Default configuration created")
             else:
-                logger.debug(f"Existing config found: name={config.name}, port={config.port}")
+                logger.debug("Existing config found")
         except Exception as e:
             logger.error(f"Error checking/creating default config: {e}")
             logger.error(traceback.format_exc())
             raise
-        finally:
-            db.close()
             
         logger.info("Database initialization complete")
     except Exception as e:
@@ -148,6 +203,71 @@ def init_db():
         raise
 
 
+_PRESET_FIELDS = ("name", "directory", "command", "frontend_directory", "frontend_command", "port")
+
+
+def seed_presets(rows: List[Dict]):
+    """Bulk-insert preset rows via Core; rows whose name already exists are skipped"""
+    if not rows:
+        return
+    # executemany needs every row to bind the same parameter set
+    rows = [{col: row.get(col) for col in _PRESET_FIELDS} for row in rows]
+    with engine.begin() as conn:
+        conn.execute(ProjectPreset.__table__.insert().prefix_with("OR IGNORE"), rows)
+    logger.info(f"Seeded {len(rows)} preset(s)")
+
+
+# Detached snapshot of the singleton ProjectConfig row, dropped on every write
+_config_cache: Optional[ProjectConfig] = None
+# Bumped by every invalidation so a load that raced a write doesn't cache the stale row
+_config_generation = 0
+
+
+def get_project_config() -> Optional[ProjectConfig]:
+    """Return the cached project config, loading it on first use.
+    
+    The returned object is detached and read-only; routes that modify the
+    config must query it through their own session and then call
+    invalidate_config_cache().
+    """
+    global _config_cache
+    config = _config_cache
+    if config is None:
+        generation = _config_generation
+        db = SessionLocal()
+        try:
+            config = db.query(ProjectConfig).first()
+            if config is not None:
+                db.expunge(config)
+                if generation == _config_generation:
+                    _config_cache = config
+        finally:
+            db.close()
+    return config
+
+
+async def get_async_project_config() -> Optional[ProjectConfig]:
+    """get_project_config for async callers: a cache miss loads through the async engine"""
+    global _config_cache
+    config = _config_cache
+    if config is None:
+        generation = _config_generation
+        async with AsyncSessionLocal() as db:
+            config = (await db.execute(select(ProjectConfig).limit(1))).scalar_one_or_none()
+            if config is not None:
+                db.expunge(config)
+                if generation == _config_generation:
+                    _config_cache = config
+    return config
+
+
+def invalidate_config_cache():
+    """Drop the cached project config so the next read reloads it"""
+    global _config_cache, _config_generation
+    _config_generation += 1
+    _config_cache = None
+
+
 def get_db():
     """Dependency for FastAPI routes"""
     db = SessionLocal()
@@ -159,3 +279,14 @@ def get_db():
         raise
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Async dependency for FastAPI routes"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database session error: {e}")
+            logger.error(traceback.format_exc())
+            raise
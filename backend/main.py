@@ -1,15 +1,18 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, Set, Dict
 import asyncio
-import uuid
+import json
+import collections
+import hashlib
+import atexit
 import logging
-import traceback
-import logging
-import traceback
+import logging.handlers
+import queue as queue_module
 import sys
 from contextlib import asynccontextmanager
 
@@ -26,6 +29,16 @@ logging.basicConfig(
         logging.StreamHandler(sys.stdout)
     ]
 )
+
+# Handlers write from a listener thread; callers (incl. the event loop) only enqueue the record
+_log_records: queue_module.SimpleQueue = queue_module.SimpleQueue()
+_root_logger = logging.getLogger()
+_log_listener = logging.handlers.QueueListener(_log_records, *_root_logger.handlers, respect_handler_level=True)
+_root_logger.handlers = [logging.handlers.QueueHandler(_log_records)]
+_log_listener.start()
+# Stop (and flush) at interpreter exit rather than in lifespan, so shutdown logging isn't lost
+atexit.register(_log_listener.stop)
+
 logger = logging.getLogger("BackendBuddy")
 logger.setLevel(_log_level)
 
@@ -34,7 +47,7 @@ logging.getLogger("uvicorn").setLevel(_log_level)
 logging.getLogger("uvicorn.access").setLevel(_log_level)
 logging.getLogger("uvicorn.error").setLevel(_log_level)
 
-from database import init_db, get_db, ProjectConfig, ProjectPreset
+from database import init_db, get_async_db, get_project_config, get_async_project_config, invalidate_config_cache, async_engine, ProjectConfig, ProjectPreset
 from server_manager import server_manager
 from queue_manager import queue_manager
 from network_manager import network_manager
@@ -47,30 +60,73 @@ async def lifespan(app: FastAPI):
     global main_loop
     main_loop = asyncio.get_running_loop()
     
+    # 3.12+: run new tasks synchronously until their first real suspension
+    if sys.version_info >= (3, 12):
+        main_loop.set_task_factory(asyncio.eager_task_factory)
+    
+    # Warm the config cache so the first requests don't pay the DB load
+    await get_async_project_config()
+    
     # Startup: Start background tasks
+    global traffic_queue, traffic_bus
     logger.info("Starting background tasks...")
     task = asyncio.create_task(queue_timeout_checker())
+    traffic_queue = asyncio.Queue(maxsize=TRAFFIC_QUEUE_SIZE)
+    traffic_task = asyncio.create_task(traffic_drain())
+    traffic_bus = asyncio.Queue(maxsize=TRAFFIC_BUS_SIZE)
+    fanout_task = asyncio.create_task(traffic_fanout())
+    heartbeat_task = asyncio.create_task(heartbeat_flush())
+    notify_task = asyncio.create_task(queue_manager._notify_loop())
+    global proxy_client
+    proxy_client = httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100)
+    )
     logger.info("Background tasks started")
     yield
     # Shutdown: Cleanup
     logger.info("Shutting down Application...")
     try:
-        # Cancel background task
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        # Flush pending traffic events, then cancel background tasks
+        await traffic_queue.join()
+        for bg_task in (task, traffic_task, fanout_task, heartbeat_task, notify_task):
+            bg_task.cancel()
+            try:
+                await bg_task
+            except asyncio.CancelledError:
+                pass
             
         server_manager.stop()
         network_manager.stop_ngrok()
-        network_manager.stop_cloudflare()
+        await network_manager.stop_cloudflare()
         logger.info("Server and ngrok/cloudflared stopped")
+        await proxy_client.aclose()
+        # Close pooled aiosqlite connections (each owns a worker thread)
+        await async_engine.dispose()
     except Exception as e:
         logger.error(f"Error during shutdown cleanup: {e}")
 
+# Serialize responses and WebSocket payloads with orjson when installed
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+
+    def dumps_json(obj) -> str:
+        """Compact JSON text for a WebSocket text frame"""
+        return orjson.dumps(obj).decode()
+except ImportError:
+    DefaultResponse = JSONResponse
+
+    def dumps_json(obj) -> str:
+        """Compact JSON text for a WebSocket text frame (same encoding as send_json)"""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
 # Initialize FastAPI app
-app = FastAPI(title="BackendBuddy - Vibecoding Project Manager", lifespan=lifespan)
+app = FastAPI(
+    title="BackendBuddy - Vibecoding Project Manager",
+    lifespan=lifespan,
+    default_response_class=DefaultResponse
+)
 
 # CORS middleware
 app.add_middleware(
@@ -83,44 +139,86 @@ app.add_middleware(
 
 
 # Traffic monitoring middleware
-@app.middleware("http")
-async def traffic_monitoring_middleware(request: Request, call_next):
-    """Track all HTTP requests for traffic monitoring"""
-    start_time = time_module.time()
-    
-    # Get request info
-    method = request.method
-    path = request.url.path
-    client_ip = request.client.host if request.client else "unknown"
-    user_agent = request.headers.get("user-agent", "")
-    
-    # Get request body size (approximate)
-    content_length = request.headers.get("content-length", "0")
-    bytes_in = int(content_length) if content_length.isdigit() else 0
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Calculate latency
-    latency_ms = (time_module.time() - start_time) * 1000
+# Traffic endpoints aren't recorded, to avoid the monitor feeding on itself
+_SKIP_TRAFFIC_PREFIXES = ("/api/traffic", "/ws/traffic")
+
+
+class TrafficASGIMiddleware:
+    """Track all HTTP requests for traffic monitoring.
     
-    # Get response size (approximate)
-    bytes_out = int(response.headers.get("content-length", 0))
+    Pure ASGI so requests aren't wrapped in BaseHTTPMiddleware's per-request
+    streams and task groups; everything is read straight from the scope.
+    """
     
-    # Log to traffic monitor (skip traffic endpoints to avoid recursion)
-    if not path.startswith("/api/traffic") and not path.startswith("/ws/traffic"):
-        traffic_monitor.log_request(
-            method=method,
-            path=path,
-            status=response.status_code,
-            latency_ms=latency_ms,
-            client_ip=client_ip,
-            user_agent=user_agent,
-            bytes_in=bytes_in,
-            bytes_out=bytes_out
-        )
+    def __init__(self, app):
+        self.app = app
     
-    return response
+    async def __call__(self, scope, receive, send):
+        # WebSockets and the traffic endpoints themselves (avoids recursion) pass straight through
+        if scope["type"] != "http" or scope["path"].startswith(_SKIP_TRAFFIC_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        
+        start_ns = time_module.perf_counter_ns()
+        
+        # Get request info
+        method = scope["method"]
+        path = scope["path"]
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        user_agent = ""
+        bytes_in = 0
+        for key, value in scope["headers"]:
+            if key == b"content-length":
+                try:
+                    bytes_in = int(value)
+                except ValueError:
+                    pass
+            elif key == b"user-agent":
+                user_agent = value.decode("latin-1")
+        
+        response_info = {"status": None, "bytes_out": 0}
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response_info["status"] = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key == b"content-length":
+                        try:
+                            response_info["bytes_out"] = int(value)
+                        except ValueError:
+                            pass
+                        break
+            await send(message)
+        
+        # Process request
+        await self.app(scope, receive, send_wrapper)
+        
+        # Calculate latency
+        latency_ms = (time_module.perf_counter_ns() - start_ns) / 1_000_000
+        
+        # Log to traffic monitor
+        if response_info["status"] is not None:
+            event = {
+                "method": method,
+                "path": path,
+                "status": response_info["status"],
+                "latency_ms": latency_ms,
+                "client_ip": client_ip,
+                "user_agent": user_agent,
+                "bytes_in": bytes_in,
+                "bytes_out": response_info["bytes_out"],
+            }
+            if traffic_queue is None:
+                traffic_monitor.log_request(**event)
+            else:
+                try:
+                    traffic_queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    pass  # Drop under backpressure, monitoring is best-effort
+
+
+app.add_middleware(TrafficASGIMiddleware)
 
 
 # Initialize database
@@ -129,8 +227,7 @@ try:
     init_db()
     logger.info("Database initialized successfully")
 except Exception as e:
-    logger.error(f"Database initialization failed: {e}")
-    logger.error(traceback.format_exc())
+    logger.exception("Database initialization failed: %s", e)
     raise
 
 # Pydantic models
@@ -158,24 +255,68 @@ class QueueAction(BaseModel):
 
 # WebSocket connections for logs
 MAX_WS_CONNECTIONS = 10  # Limit to prevent resource exhaustion
-log_connections: List[WebSocket] = []
+log_connections: Set[WebSocket] = set()
+LOG_CLIENT_QUEUE_SIZE = 512
+LOG_BATCH_MAX = 64  # Max log lines coalesced into a single frame
+LOG_BATCH_LINGER = 0.05  # Seconds to wait after the first line so a burst ships as one frame
+log_queues: Dict[WebSocket, asyncio.Queue] = {}
 
 # WebSocket connections for queue updates
-queue_connections: List[WebSocket] = []
+queue_connections: Set[WebSocket] = set()
+QUEUE_UPDATE_INTERVAL = 0.05  # Min seconds between queue snapshots to one client
+queue_slots: Dict[WebSocket, tuple] = {}  # (pending payload holder, dirty event) per client
 
 # WebSocket connections for traffic monitoring
-traffic_connections: List[WebSocket] = []
+traffic_connections: Set[WebSocket] = set()
+TRAFFIC_CLIENT_QUEUE_SIZE = 500
+traffic_queues: Dict[WebSocket, asyncio.Queue] = {}
 
 # Global event loop reference
 main_loop: Optional[asyncio.AbstractEventLoop] = None
 
+# Traffic events waiting to be recorded, drained by traffic_drain (created in lifespan)
+TRAFFIC_QUEUE_SIZE = 10000
+TRAFFIC_DRAIN_BATCH = 100
+traffic_queue: Optional[asyncio.Queue] = None
+
+# Recorded traffic events waiting to be pushed to /ws/traffic clients by traffic_fanout (created in lifespan)
+TRAFFIC_BUS_SIZE = 2000
+traffic_bus: Optional[asyncio.Queue] = None
+
+# Heartbeat timestamps by session_id, applied to queue_manager by heartbeat_flush (created in lifespan)
+HEARTBEAT_FLUSH_INTERVAL = 0.25
+_heartbeat_buf: Dict[str, float] = {}
+
+
+_LOCAL_HOSTS = frozenset(("127.0.0.1", "localhost", "::1"))
+
+# Pre-generated session IDs; one os.urandom call fills the whole pool
+_SESSION_ID_POOL_SIZE = 256
+_session_id_pool: collections.deque = collections.deque()
+
+
+def _refill_session_id_pool(n: int = _SESSION_ID_POOL_SIZE):
+    """Fill the pool with n random 128-bit hex tokens (as secrets.token_hex(16)) from a single urandom read"""
+    buf = os.urandom(16 * n).hex()
+    _session_id_pool.extend(buf[i:i + 32] for i in range(0, 32 * n, 32))
+
+
+def new_session_id() -> str:
+    """Return a fresh random session ID"""
+    try:
+        return _session_id_pool.popleft()
+    except IndexError:
+        _refill_session_id_pool()
+        return _session_id_pool.popleft()
+
 
 # Middleware to check if user should be in waiting room
 def is_local_request(request: Request) -> bool:
     """Check if request is from localhost"""
     client_host = request.client.host if request.client else ""
-    is_local = client_host in ["127.0.0.1", "localhost", "::1"]
-    logger.debug(f"Request from {client_host} - is_local: {is_local}")
+    is_local = client_host in _LOCAL_HOSTS
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request from %s - is_local: %s", client_host, is_local)
     return is_local
 
 
@@ -184,9 +325,8 @@ def is_local_request(request: Request) -> bool:
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Catch all exceptions and log them"""
-    logger.error(f"Unhandled exception: {exc}")
-    logger.error(traceback.format_exc())
-    return JSONResponse(
+    logger.error("Unhandled exception: %s", exc, exc_info=exc)
+    return DefaultResponse(
         status_code=500,
         content={"detail": str(exc), "type": type(exc).__name__}
     )
@@ -194,37 +334,62 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 # ===== PROJECT CONFIG ENDPOINTS =====
 
+# (config snapshot, encoded body, etag); rebuilt whenever get_project_config() hands back a new snapshot
+_config_body: Optional[tuple] = None
+
+
+def _etag(body: bytes) -> str:
+    """Strong ETag for an encoded response body"""
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def _cached_json(request: Request, body: bytes, etag: str) -> Response:
+    """Serve a pre-encoded body, or an empty 304 if the client already has it"""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+def _render_config(config: ProjectConfig) -> bytes:
+    """Encode the /api/config response body for a config snapshot"""
+    result = {
+        "name": config.name,
+        "directory": config.directory,
+        "command": config.command,
+        "frontend_directory": config.frontend_directory,
+        "frontend_command": config.frontend_command,
+        "port": config.port,
+        "lan_ip": config.lan_ip,
+        "lan_enabled": config.lan_enabled,
+        "ngrok_enabled": config.ngrok_enabled,
+        "cloudflare_enabled": getattr(config, "cloudflare_enabled", False),
+        "queue_enabled": config.queue_enabled,
+        "updated_at": config.updated_at.isoformat() if config.updated_at else None
+    }
+    logger.debug("Rendered config: %s", result)
+    return DefaultResponse(content=result).body
+
+
 @app.get("/api/config")
-def get_config(db: Session = Depends(get_db)):
+async def get_config(request: Request):
     """Get current project configuration"""
+    global _config_body
     logger.debug("GET /api/config called")
     try:
-        config = db.query(ProjectConfig).first()
+        config = await get_async_project_config()
         if not config:
             logger.warning("No configuration found in database")
             raise HTTPException(status_code=404, detail="Configuration not found")
         
-        result = {
-            "name": config.name,
-            "directory": config.directory,
-            "command": config.command,
-            "frontend_directory": config.frontend_directory,
-            "frontend_command": config.frontend_command,
-            "port": config.port,
-            "lan_ip": config.lan_ip,
-            "lan_enabled": config.lan_enabled,
-            "ngrok_enabled": config.ngrok_enabled,
-            "cloudflare_enabled": getattr(config, "cloudflare_enabled", False),
-            "queue_enabled": config.queue_enabled,
-            "updated_at": config.updated_at.isoformat() if config.updated_at else None
-        }
-        logger.debug(f"Returning config: {result}")
-        return result
+        cached = _config_body
+        if cached is None or cached[0] is not config:
+            body = _render_config(config)
+            cached = _config_body = (config, body, _etag(body))
+        return _cached_json(request, cached[1], cached[2])
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in get_config: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in get_config: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -238,64 +403,31 @@ def scan_project_endpoint(path: str):
     return result
 
 @app.put("/api/config")
-def update_config(update: ProjectConfigUpdate, db: Session = Depends(get_db)):
+async def update_config(update: ProjectConfigUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update project configuration"""
-    logger.info(f"PUT /api/config called with: {update.dict()}")
+    # Only fields the client sent; explicit nulls are ignored as before (bool columns are NOT NULL)
+    changes = update.model_dump(exclude_unset=True, exclude_none=True)
+    logger.info("PUT /api/config patch: %s", changes)
     try:
-        config = db.query(ProjectConfig).first()
+        config = (await db.execute(select(ProjectConfig).limit(1))).scalar_one_or_none()
         if not config:
             logger.warning("No configuration found to update")
             raise HTTPException(status_code=404, detail="Configuration not found")
         
-        # Update fields
-        if update.name is not None:
-            logger.debug(f"Updating name: {config.name} -> {update.name}")
-            config.name = update.name
-        if update.directory is not None:
-            logger.debug(f"Updating directory: {config.directory} -> {update.directory}")
-            config.directory = update.directory
-        if update.command is not None:
-            logger.debug(f"Updating command: {config.command} -> {update.command}")
-            config.command = update.command
-        if update.frontend_directory is not None:
-            logger.debug(f"Updating frontend_directory: {config.frontend_directory} -> {update.frontend_directory}")
-            config.frontend_directory = update.frontend_directory
-        if update.frontend_command is not None:
-            logger.debug(f"Updating frontend_command: {config.frontend_command} -> {update.frontend_command}")
-            config.frontend_command = update.frontend_command
-        if update.port is not None:
-            logger.debug(f"Updating port: {config.port} -> {update.port}")
-            config.port = update.port
-        if update.lan_ip is not None:
-            logger.debug(f"Updating lan_ip: {config.lan_ip} -> {update.lan_ip}")
-            config.lan_ip = update.lan_ip
-        if update.lan_enabled is not None:
-            logger.debug(f"Updating lan_enabled: {config.lan_enabled} -> {update.lan_enabled}")
-            config.lan_enabled = update.lan_enabled
-        if update.ngrok_enabled is not None:
-            logger.debug(f"Updating ngrok_enabled: {config.ngrok_enabled} -> {update.ngrok_enabled}")
-            config.ngrok_enabled = update.ngrok_enabled
-            # Note: Tunnels are now started/stopped via dedicated buttons, not config save
+        # Tunnels are started/stopped via dedicated buttons, not config save
+        for field, value in changes.items():
+            setattr(config, field, value)
         
-        if update.cloudflare_enabled is not None:
-            logger.debug(f"Updating cloudflare_enabled: {getattr(config, 'cloudflare_enabled', False)} -> {update.cloudflare_enabled}")
-            config.cloudflare_enabled = update.cloudflare_enabled
-            # Note: Tunnels are now started/stopped via dedicated buttons, not config save
-        
-        if update.queue_enabled is not None:
-            logger.debug(f"Updating queue_enabled: {config.queue_enabled} -> {update.queue_enabled}")
-            config.queue_enabled = update.queue_enabled
-        
-        db.commit()
-        db.refresh(config)
+        await db.commit()
+        await db.refresh(config)
+        invalidate_config_cache()
         
         logger.info("Configuration updated successfully")
         return {"success": True, "message": "Configuration updated"}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in update_config: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in update_config: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -305,35 +437,39 @@ class PresetCreate(BaseModel):
     name: str
 
 @app.get("/api/presets")
-def list_presets(db: Session = Depends(get_db)):
+async def list_presets(db: AsyncSession = Depends(get_async_db)):
     """List all saved presets"""
     logger.debug("GET /api/presets called")
     try:
-        presets = db.query(ProjectPreset).all()
+        presets = (await db.execute(select(ProjectPreset))).scalars().all()
         return [{"id": p.id, "name": p.name, "directory": p.directory} for p in presets]
     except Exception as e:
         logger.error(f"Error listing presets: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/presets")
-def save_preset(preset: PresetCreate, db: Session = Depends(get_db)):
+async def save_preset(preset: PresetCreate, db: AsyncSession = Depends(get_async_db)):
     """Save current config as a preset"""
     logger.info(f"POST /api/presets - saving as '{preset.name}'")
     try:
-        config = db.query(ProjectConfig).first()
+        config = await get_async_project_config()
         if not config:
             raise HTTPException(status_code=404, detail="No config to save")
         
-        # Check if preset name exists
-        existing = db.query(ProjectPreset).filter(ProjectPreset.name == preset.name).first()
-        if existing:
-            # Update existing
-            existing.directory = config.directory
-            existing.command = config.command
-            existing.frontend_directory = config.frontend_directory
-            existing.frontend_command = config.frontend_command
-            existing.port = config.port
-            db.commit()
+        # Update in place if the preset name exists (one UPDATE, no SELECT first)
+        result = await db.execute(
+            update(ProjectPreset)
+            .where(ProjectPreset.name == preset.name)
+            .values(
+                directory=config.directory,
+                command=config.command,
+                frontend_directory=config.frontend_directory,
+                frontend_command=config.frontend_command,
+                port=config.port
+            )
+        )
+        if result.rowcount:
+            await db.commit()
             return {"success": True, "message": f"Preset '{preset.name}' updated"}
         
         # Create new
@@ -346,7 +482,7 @@ def save_preset(preset: PresetCreate, db: Session = Depends(get_db)):
             port=config.port
         )
         db.add(new_preset)
-        db.commit()
+        await db.commit()
         return {"success": True, "message": f"Preset '{preset.name}' saved"}
     except HTTPException:
         raise
@@ -355,25 +491,30 @@ def save_preset(preset: PresetCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/presets/{preset_id}/load")
-def load_preset(preset_id: int, db: Session = Depends(get_db)):
+async def load_preset(preset_id: int, db: AsyncSession = Depends(get_async_db)):
     """Load a preset into current config"""
     logger.info(f"POST /api/presets/{preset_id}/load")
     try:
-        preset = db.query(ProjectPreset).filter(ProjectPreset.id == preset_id).first()
+        preset = await db.get(ProjectPreset, preset_id)
         if not preset:
             raise HTTPException(status_code=404, detail="Preset not found")
         
-        config = db.query(ProjectConfig).first()
-        if not config:
+        result = await db.execute(
+            update(ProjectConfig)
+            .where(ProjectConfig.id == 1)
+            .values(
+                name=preset.name,
+                directory=preset.directory,
+                command=preset.command,
+                frontend_directory=preset.frontend_directory,
+                frontend_command=preset.frontend_command,
+                port=preset.port
+            )
+        )
+        if not result.rowcount:
             raise HTTPException(status_code=404, detail="No config found")
-        
-        config.name = preset.name
-        config.directory = preset.directory
-        config.command = preset.command
-        config.frontend_directory = preset.frontend_directory
-        config.frontend_command = preset.frontend_command
-        config.port = preset.port
-        db.commit()
+        await db.commit()
+        invalidate_config_cache()
         
         return {"success": True, "message": f"Loaded preset '{preset.name}'"}
     except HTTPException:
@@ -383,17 +524,17 @@ def load_preset(preset_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/presets/{preset_id}")
-def delete_preset(preset_id: int, db: Session = Depends(get_db)):
+async def delete_preset(preset_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a preset"""
     logger.info(f"DELETE /api/presets/{preset_id}")
     try:
-        preset = db.query(ProjectPreset).filter(ProjectPreset.id == preset_id).first()
+        preset = await db.get(ProjectPreset, preset_id)
         if not preset:
             raise HTTPException(status_code=404, detail="Preset not found")
         
         name = preset.name
-        db.delete(preset)
-        db.commit()
+        await db.delete(preset)
+        await db.commit()
         return {"success": True, "message": f"Deleted preset '{name}'"}
     except HTTPException:
         raise
@@ -405,11 +546,11 @@ def delete_preset(preset_id: int, db: Session = Depends(get_db)):
 # ===== SERVER CONTROL ENDPOINTS =====
 
 @app.post("/api/server")
-def control_server(command: ServerCommand, db: Session = Depends(get_db)):
+def control_server(command: ServerCommand):
     """Control the dev server"""
     logger.info(f"POST /api/server called with action: {command.action}")
     try:
-        config = db.query(ProjectConfig).first()
+        config = get_project_config()
         if not config:
             logger.warning("No configuration found")
             raise HTTPException(status_code=404, detail="Configuration not found")
@@ -468,32 +609,13 @@ def control_server(command: ServerCommand, db: Session = Depends(get_db)):
             )
             logger.info(f"Restart result: {result}")
             
-            # Ensure tunnels are running if they should be (in case they crashed or weren't running)
+            # Ensure tunnels are running if they should be (in case they crashed or weren't running).
+            # Done in the background on the event loop so the response doesn't wait on tunnel checks/startup.
             if result["success"]:
-                try:
-                    if config.ngrok_enabled and config.port:
-                        ngrok_status = network_manager.get_ngrok_status()
-                        if not ngrok_status["running"]:
-                            logger.info(f"Starting ngrok on port {config.port} (was not running)")
-                            ngrok_result = network_manager.start_ngrok(config.port)
-                            if not ngrok_result["success"]:
-                                logger.warning(f"ngrok warning: {ngrok_result['message']}")
-                        else:
-                            logger.info("ngrok tunnel persisted")
-
-                    if getattr(config, "cloudflare_enabled", False) and config.port:
-                        # Check if cloudflare is running
-                        if not network_manager.cloudflare_process:
-                            logger.info(f"Starting cloudflared on port {config.port} (was not running)")
-                            cf_result = network_manager.start_cloudflare(config.port)
-                            if not cf_result["success"]:
-                                logger.warning(f"cloudflared warning: {cf_result['message']}")
-                        else:
-                             logger.info("cloudflared tunnel persisted")
-                except Exception as e:
-                    logger.error(f"Error restoring tunnels after restart: {e}")
-            
-            return result
+                asyncio.run_coroutine_threadsafe(
+                    restore_tunnels(config.port, config.ngrok_enabled, getattr(config, "cloudflare_enabled", False)),
+                    main_loop
+                )
             
             return result
         
@@ -503,22 +625,48 @@ def control_server(command: ServerCommand, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in control_server: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in control_server: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def restore_tunnels(port: Optional[int], ngrok_enabled: bool, cloudflare_enabled: bool):
+    """Restart any enabled tunnel that is not running (used after a server restart)"""
+    if not port:
+        return
+    try:
+        if ngrok_enabled:
+            ngrok_status = network_manager.get_ngrok_status()
+            if not ngrok_status["running"]:
+                logger.info(f"Starting ngrok on port {port} (was not running)")
+                ngrok_result = await network_manager.start_ngrok(port)
+                if not ngrok_result["success"]:
+                    logger.warning(f"ngrok warning: {ngrok_result['message']}")
+            else:
+                logger.info("ngrok tunnel persisted")
+
+        if cloudflare_enabled:
+            # Check if cloudflare is running
+            if not network_manager.cloudflare_process:
+                logger.info(f"Starting cloudflared on port {port} (was not running)")
+                cf_result = await network_manager.start_cloudflare(port)
+                if not cf_result["success"]:
+                    logger.warning(f"cloudflared warning: {cf_result['message']}")
+            else:
+                logger.info("cloudflared tunnel persisted")
+    except Exception as e:
+        logger.error(f"Error restoring tunnels after restart: {e}")
+
+
 @app.get("/api/server/status")
 def get_server_status():
     """Get server status"""
     logger.debug("GET /api/server/status called")
     try:
         status = server_manager.get_status()
-        logger.debug(f"Server status: {status}")
+        logger.debug("Server status: %s", status)
         return status
     except Exception as e:
-        logger.error(f"Error in get_server_status: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in get_server_status: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -531,52 +679,71 @@ def get_logs():
         logger.debug(f"Returning {len(logs)} log entries")
         return {"logs": logs}
     except Exception as e:
-        logger.error(f"Error in get_logs: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in get_logs: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ===== NETWORK/LINKS ENDPOINTS =====
 
+# (inputs the links were built from, encoded body, etag)
+_links_body: Optional[tuple] = None
+
+
+def _build_links(config: ProjectConfig, lan_ips: list) -> dict:
+    """Build the /api/links response for a config snapshot"""
+    # Generate base links
+    links = {
+        "localhost": f"http://localhost:{config.port}",
+        "lan": [],  # Now an array of all LAN links
+        "ngrok": None,
+        "cloudflare": None
+    }
+    
+    # Add all LAN links if LAN is enabled
+    if config.lan_enabled and lan_ips:
+        links["lan"] = [f"http://{ip}:{config.port}" for ip in lan_ips]
+    
+    # Add ngrok link if enabled
+    if config.ngrok_enabled and network_manager.ngrok_url:
+        links["ngrok"] = network_manager.ngrok_url
+    
+    # Surface a failed tunnel start instead of just leaving the link empty
+    errors = {"ngrok": network_manager.ngrok_error if config.ngrok_enabled else None}
+        
+    # Add cloudflare link if enabled
+    if getattr(config, "cloudflare_enabled", False) and network_manager.cloudflare_url:
+        links["cloudflare"] = network_manager.cloudflare_url
+    
+    logger.debug("Generated links: %s", links)
+    
+    return {"links": links, "lan_ips": lan_ips, "errors": errors}
+
+
 @app.get("/api/links")
-def get_links(db: Session = Depends(get_db)):
+def get_links(request: Request):
     """Get all access links with auto-detected LAN IPs"""
+    global _links_body
     logger.debug("GET /api/links called")
     try:
-        config = db.query(ProjectConfig).first()
+        config = get_project_config()
         if not config or not config.port:
             logger.debug("No config or port, returning empty links")
             return {"links": {}, "lan_ips": []}
         
         # Auto-detect LAN IPs
         lan_ips = network_manager.get_lan_ips()
+        if config.ngrok_enabled:
+            network_manager.get_ngrok_status()  # notices an ngrok that exited since the last poll
         
-        # Generate base links
-        links = {
-            "localhost": f"http://localhost:{config.port}",
-            "lan": [],  # Now an array of all LAN links
-            "ngrok": None,
-            "cloudflare": None
-        }
-        
-        # Add all LAN links if LAN is enabled
-        if config.lan_enabled and lan_ips:
-            links["lan"] = [f"http://{ip}:{config.port}" for ip in lan_ips]
-        
-        # Add ngrok link if enabled
-        if config.ngrok_enabled and network_manager.ngrok_url:
-            links["ngrok"] = network_manager.ngrok_url
-            
-        # Add cloudflare link if enabled
-        if getattr(config, "cloudflare_enabled", False) and network_manager.cloudflare_url:
-            links["cloudflare"] = network_manager.cloudflare_url
-        
-        logger.debug(f"Generated links: {links}")
-        
-        return {"links": links, "lan_ips": lan_ips}
+        key = (config, tuple(lan_ips), network_manager.ngrok_url, network_manager.ngrok_error,
+               network_manager.cloudflare_url)
+        cached = _links_body
+        if cached is None or cached[0] != key:
+            body = DefaultResponse(content=_build_links(config, lan_ips)).body
+            cached = _links_body = (key, body, _etag(body))
+        return _cached_json(request, cached[1], cached[2])
     except Exception as e:
-        logger.error(f"Error in get_links: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in get_links: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -585,11 +752,11 @@ def get_lan_ips():
     """Get auto-detected LAN IP addresses"""
     logger.debug("GET /api/network/lan-ips called")
     try:
-        ips = network_manager.get_lan_ips()
+        # Explicit detection request: bypass the TTL cache (and refresh it for /api/links)
+        ips = network_manager.refresh_lan_ips()
         return {"lan_ips": ips}
     except Exception as e:
-        logger.error(f"Error in get_lan_ips: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in get_lan_ips: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -599,74 +766,73 @@ class TunnelAction(BaseModel):
     action: str  # start, stop
 
 @app.post("/api/ngrok")
-def control_ngrok(action: TunnelAction, db: Session = Depends(get_db)):
+async def control_ngrok(action: TunnelAction):
     """Start or stop ngrok tunnel"""
     logger.info(f"POST /api/ngrok called with action: {action.action}")
     try:
-        config = db.query(ProjectConfig).first()
+        config = await get_async_project_config()
         if not config:
             raise HTTPException(status_code=404, detail="Configuration not found")
         
         if action.action == "start":
             if config.port:
-                result = network_manager.start_ngrok(config.port)
+                result = await network_manager.start_ngrok(config.port)
                 logger.info(f"ngrok result: {result}")
                 return result
             else:
                 return {"success": False, "message": "No port configured"}
         elif action.action == "stop":
-            network_manager.stop_ngrok()
+            # stop_ngrok waits for the process to exit: keep that off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, network_manager.stop_ngrok)
             return {"success": True, "message": "ngrok stopped"}
         else:
             raise HTTPException(status_code=400, detail=f"Unknown action: {action.action}")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in control_ngrok: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in control_ngrok: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/cloudflare")
-def control_cloudflare(action: TunnelAction, db: Session = Depends(get_db)):
+async def control_cloudflare(action: TunnelAction):
     """Start or stop cloudflare tunnel"""
     logger.info(f"POST /api/cloudflare called with action: {action.action}")
     try:
-        config = db.query(ProjectConfig).first()
+        config = await get_async_project_config()
         if not config:
             raise HTTPException(status_code=404, detail="Configuration not found")
         
         if action.action == "start":
             if config.port:
-                result = network_manager.start_cloudflare(config.port)
+                result = await network_manager.start_cloudflare(config.port)
                 logger.info(f"cloudflare result: {result}")
                 return result
             else:
                 return {"success": False, "message": "No port configured"}
         elif action.action == "stop":
-            network_manager.stop_cloudflare()
+            await network_manager.stop_cloudflare()
             return {"success": True, "message": "cloudflare stopped"}
         else:
             raise HTTPException(status_code=400, detail=f"Unknown action: {action.action}")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in control_cloudflare: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in control_cloudflare: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ===== QUEUE MANAGEMENT ENDPOINTS =====
 
 @app.post("/api/queue/join")
-async def join_queue(action: QueueAction, request: Request, db: Session = Depends(get_db)):
+async def join_queue(action: QueueAction, request: Request):
     """Join the waiting room queue"""
-    logger.debug(f"POST /api/queue/join called with session_id: {action.session_id}")
+    logger.debug("POST /api/queue/join called with session_id: %s", action.session_id)
     try:
-        config = db.query(ProjectConfig).first()
+        config = await get_async_project_config()
         
         # If queue is disabled or request is local, grant immediate access
         if not config or not config.queue_enabled or is_local_request(request):
-            session_id = action.session_id or str(uuid.uuid4())
+            session_id = action.session_id or new_session_id()
             logger.info(f"Queue bypassed for session {session_id}")
             return {
                 "session_id": session_id,
@@ -679,8 +845,7 @@ async def join_queue(action: QueueAction, request: Request, db: Session = Depend
         logger.info(f"Queue join result: {result}")
         return result
     except Exception as e:
-        logger.error(f"Error in join_queue: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in join_queue: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -698,26 +863,30 @@ async def leave_queue(action: QueueAction):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in leave_queue: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in leave_queue: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/queue/heartbeat")
 async def queue_heartbeat(action: QueueAction):
     """Send heartbeat to maintain queue position"""
-    logger.debug(f"POST /api/queue/heartbeat called with session_id: {action.session_id}")
+    logger.debug("POST /api/queue/heartbeat called with session_id: %s", action.session_id)
     try:
         if not action.session_id:
             raise HTTPException(status_code=400, detail="session_id required")
         
-        result = queue_manager.heartbeat(action.session_id)
-        return result
+        status = queue_manager.get_user_status(action.session_id)
+        if status is None:
+            logger.warning("Heartbeat from unknown session: %s", action.session_id)
+            return {"success": False, "message": "Session not found"}
+        
+        # Buffered; heartbeat_flush applies it within HEARTBEAT_FLUSH_INTERVAL
+        _heartbeat_buf[action.session_id] = time_module.monotonic()
+        return {"success": True, **status}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in queue_heartbeat: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in queue_heartbeat: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -727,11 +896,10 @@ def get_queue_status():
     logger.debug("GET /api/queue/status called")
     try:
         state = queue_manager.get_queue_state()
-        logger.debug(f"Queue state: {state}")
+        logger.debug("Queue state: %s", state)
         return state
     except Exception as e:
-        logger.error(f"Error in get_queue_status: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in get_queue_status: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -748,76 +916,151 @@ def get_my_queue_status(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in get_my_queue_status: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error in get_my_queue_status: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ===== WEBSOCKET ENDPOINTS =====
 
+async def _reject_if_full(websocket: WebSocket, pool: Set[WebSocket], name: str) -> bool:
+    """Close the socket with 1013 (try again later) if pool is at MAX_WS_CONNECTIONS"""
+    if len(pool) < MAX_WS_CONNECTIONS:
+        return False
+    logger.warning(f"WebSocket {name} connection rejected: limit reached ({MAX_WS_CONNECTIONS})")
+    await websocket.close(code=1013, reason="Too many connections")
+    return True
+
+
+def _put_drop_oldest(queue: asyncio.Queue, item):
+    """put_nowait that makes room by discarding the oldest item (slow clients see the newest data)"""
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        queue.get_nowait()
+        queue.put_nowait(item)
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Park until the client goes away; frames it sends are ignored"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+
+
 @app.websocket("/ws/logs")
 async def websocket_logs(websocket: WebSocket):
     """WebSocket for real-time server logs"""
     logger.info("WebSocket /ws/logs connection attempt")
     
     # Enforce connection limit
-    if len(log_connections) >= MAX_WS_CONNECTIONS:
-        logger.warning(f"WebSocket connection rejected: limit reached ({MAX_WS_CONNECTIONS})")
-        await websocket.close(code=1013, reason="Too many connections")
+    if await _reject_if_full(websocket, log_connections, "/ws/logs"):
         return
     
+    sender = None
     try:
         await websocket.accept()
         logger.info(f"WebSocket /ws/logs connection accepted ({len(log_connections)+1}/{MAX_WS_CONNECTIONS})")
-        log_connections.append(websocket)
+        # One bounded queue and one long-lived sender per client
+        log_queues[websocket] = asyncio.Queue(maxsize=LOG_CLIENT_QUEUE_SIZE)
+        log_connections.add(websocket)
+        sender = asyncio.create_task(_log_sender(websocket, log_queues[websocket]))
         
         try:
-            while True:
-                # Keep connection alive
-                await asyncio.sleep(1)
+            await _wait_for_disconnect(websocket)
         except WebSocketDisconnect:
             logger.info("WebSocket /ws/logs disconnected")
-            if websocket in log_connections:
-                log_connections.remove(websocket)
     except Exception as e:
-        logger.error(f"WebSocket /ws/logs error: {e}")
-        logger.error(traceback.format_exc())
-        if websocket in log_connections:
-            log_connections.remove(websocket)
+        logger.exception("WebSocket /ws/logs error: %s", e)
+    finally:
+        log_connections.discard(websocket)
+        log_queues.pop(websocket, None)
+        if sender:
+            sender.cancel()
+
+
+async def _log_sender(websocket: WebSocket, queue: asyncio.Queue):
+    """Drain one client's log queue onto its socket, coalescing bursts into one frame"""
+    while True:
+        batch = [await queue.get()]
+        if queue.qsize() < LOG_BATCH_MAX - 1:
+            await asyncio.sleep(LOG_BATCH_LINGER)
+        while len(batch) < LOG_BATCH_MAX:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        try:
+            # Lines never contain a newline, so the client splits the frame on it
+            await websocket.send_text("\n".join(batch))
+        except Exception as e:
+            logger.debug(f"Log send failed, dropping client: {e}")
+            log_connections.discard(websocket)
+            log_queues.pop(websocket, None)
+            return
 
 
 @app.websocket("/ws/queue")
 async def websocket_queue(websocket: WebSocket):
     """WebSocket for real-time queue updates"""
     logger.info("WebSocket /ws/queue connection attempt")
+    
+    if await _reject_if_full(websocket, queue_connections, "/ws/queue"):
+        return
+    
+    sender = None
     try:
         await websocket.accept()
         logger.info("WebSocket /ws/queue connection accepted")
-        queue_connections.append(websocket)
+        queue_connections.add(websocket)
         
-        # Add callback to queue manager
-        async def send_update(state):
-            try:
-                await websocket.send_json(state)
-            except Exception as e:
-                logger.error(f"Error sending queue update: {e}")
-        
-        queue_manager.add_callback(send_update)
+        # Conflate: keep only the newest payload; the sender ships it at most once per interval
+        pending = {"payload": dumps_json(queue_manager.get_queue_state())}
+        dirty = asyncio.Event()
+        dirty.set()  # Send initial state
+        queue_slots[websocket] = (pending, dirty)
+        sender = asyncio.create_task(_queue_sender(websocket, pending, dirty))
         
         try:
-            # Send initial state
-            await websocket.send_json(queue_manager.get_queue_state())
-            
-            while True:
-                # Keep connection alive
-                await asyncio.sleep(1)
+            await _wait_for_disconnect(websocket)
         except WebSocketDisconnect:
             logger.info("WebSocket /ws/queue disconnected")
-            queue_connections.remove(websocket)
-            queue_manager.remove_callback(send_update)
     except Exception as e:
-        logger.error(f"WebSocket /ws/queue error: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("WebSocket /ws/queue error: %s", e)
+    finally:
+        queue_connections.discard(websocket)
+        queue_slots.pop(websocket, None)
+        if sender:
+            sender.cancel()
+
+
+async def _queue_state_changed(state: dict):
+    """queue_manager callback: encode the state once and hand it to every /ws/queue client"""
+    if not queue_slots:
+        return
+    payload = dumps_json(state)
+    for pending, dirty in queue_slots.values():
+        pending["payload"] = payload
+        dirty.set()
+
+
+queue_manager.add_callback(_queue_state_changed)
+
+
+async def _queue_sender(websocket: WebSocket, pending: dict, dirty: asyncio.Event):
+    """Send the latest queue state whenever it changes, at most once per QUEUE_UPDATE_INTERVAL"""
+    while True:
+        await dirty.wait()
+        dirty.clear()
+        payload, pending["payload"] = pending["payload"], None
+        if payload is None:
+            continue
+        try:
+            await websocket.send_text(payload)
+        except Exception as e:
+            logger.error(f"Error sending queue update: {e}")
+            return
+        await asyncio.sleep(QUEUE_UPDATE_INTERVAL)
 
 
 # ===== TRAFFIC MONITORING ENDPOINTS =====
@@ -837,7 +1080,7 @@ def get_traffic_metrics():
 def get_traffic_requests(count: int = 50):
     """Get recent request history"""
     try:
-        count = min(count, 200)  # Cap at 200
+        count = max(0, min(count, 200))  # Cap at 200
         return {"requests": traffic_monitor.get_recent_requests(count)}
     except Exception as e:
         logger.error(f"Error in get_traffic_requests: {e}")
@@ -855,16 +1098,14 @@ def get_endpoint_stats():
 
 
 @app.get("/api/traffic/connections")
-def get_active_connections():
+async def get_active_connections():
     """Get list of active WebSocket connections"""
+    # Async so the connection sets are read on the loop that mutates them
     try:
         connections = []
-        for i, ws in enumerate(log_connections):
-            connections.append({"id": i, "type": "logs", "client": str(ws.client) if ws.client else "unknown"})
-        for i, ws in enumerate(queue_connections):
-            connections.append({"id": i, "type": "queue", "client": str(ws.client) if ws.client else "unknown"})
-        for i, ws in enumerate(traffic_connections):
-            connections.append({"id": i, "type": "traffic", "client": str(ws.client) if ws.client else "unknown"})
+        for conn_type, pool in (("logs", log_connections), ("queue", queue_connections), ("traffic", traffic_connections)):
+            for ws in pool:
+                connections.append({"id": id(ws), "type": conn_type, "client": str(ws.client) if ws.client else "unknown"})
         return {"connections": connections, "count": len(connections)}
     except Exception as e:
         logger.error(f"Error in get_active_connections: {e}")
@@ -887,51 +1128,49 @@ async def websocket_traffic(websocket: WebSocket):
     """WebSocket for real-time traffic updates"""
     logger.info("WebSocket /ws/traffic connection attempt")
     
-    if len(traffic_connections) >= MAX_WS_CONNECTIONS:
-        logger.warning("WebSocket connection rejected: limit reached")
-        await websocket.close(code=1013, reason="Too many connections")
+    if await _reject_if_full(websocket, traffic_connections, "/ws/traffic"):
         return
     
+    sender = None
     try:
         await websocket.accept()
         logger.info(f"WebSocket /ws/traffic connection accepted")
-        traffic_connections.append(websocket)
-        
-        # Callback for real-time updates  
-        async def send_traffic_update(data):
-            try:
-                await websocket.send_json(data)
-            except Exception as e:
-                logger.error(f"Error sending traffic update: {e}")
-        
-        # Wrap async callback for sync caller
-        def traffic_callback(data):
-            if main_loop and main_loop.is_running():
-                asyncio.run_coroutine_threadsafe(send_traffic_update(data), main_loop)
-        
-        traffic_monitor.add_callback(traffic_callback)
+        # Per-client bounded queue so one slow socket can't stall the fan-out
+        traffic_queues[websocket] = asyncio.Queue(maxsize=TRAFFIC_CLIENT_QUEUE_SIZE)
+        traffic_connections.add(websocket)
+        sender = asyncio.create_task(_traffic_sender(websocket, traffic_queues[websocket]))
         
         try:
-            while True:
-                # Keep connection alive, also handle ping/pong
-                await asyncio.sleep(1)
+            await _wait_for_disconnect(websocket)
         except WebSocketDisconnect:
             logger.info("WebSocket /ws/traffic disconnected")
-        finally:
-            if websocket in traffic_connections:
-                traffic_connections.remove(websocket)
-            traffic_monitor.remove_callback(traffic_callback)
     except Exception as e:
         logger.error(f"WebSocket /ws/traffic error: {e}")
-        if websocket in traffic_connections:
-            traffic_connections.remove(websocket)
+    finally:
+        traffic_connections.discard(websocket)
+        traffic_queues.pop(websocket, None)
+        if sender:
+            sender.cancel()
+
+
+async def _traffic_sender(websocket: WebSocket, queue: asyncio.Queue):
+    """Drain one client's traffic queue onto its socket"""
+    while True:
+        payload = await queue.get()
+        try:
+            await websocket.send_text(payload)
+        except Exception as e:
+            logger.error(f"Error sending traffic update: {e}")
+            traffic_connections.discard(websocket)
+            traffic_queues.pop(websocket, None)
+            return
 
 
 # ===== HELPER FUNCTIONS =====
 
 def broadcast_log(log_entry: str):
     """Broadcast log entry to all connected WebSocket clients"""
-    # This function is called from a background thread, so we must use run_coroutine_threadsafe
+    # This function is called from a background thread, so hand off to the loop thread-safely
     
     # Only try to broadcast if we have a loop and connections
     if not main_loop or not main_loop.is_running():
@@ -940,37 +1179,127 @@ def broadcast_log(log_entry: str):
     if not log_connections:
         return
 
-    # logger.debug(f"Broadcasting log to {len(log_connections)} connections")
-    
-    # Iterate over a copy to allow safe removal during iteration
-    for connection in list(log_connections):
-        try:
-            # Schedule the coroutine to run on the main event loop
-            asyncio.run_coroutine_threadsafe(connection.send_text(log_entry), main_loop)
-        except Exception as e:
-            logger.error(f"Error broadcasting log: {e}")
-            try:
-                log_connections.remove(connection)
-            except ValueError:
-                pass  # Already removed
+    # One loop callback per entry; the per-client queues are only touched on the loop thread
+    main_loop.call_soon_threadsafe(_enqueue_log, log_entry)
+
+
+def _enqueue_log(log_entry: str):
+    """Queue a log entry for every connected client (runs on the event loop)"""
+    # Runs on the loop with no awaits, so the dict can't change underneath us; no copy needed
+    for queue in log_queues.values():
+        _put_drop_oldest(queue, log_entry)
+
+
+def broadcast_traffic(data: dict):
+    """Hand a traffic event to the single fan-out task; O(1) for the caller regardless of client count"""
+    if not traffic_connections or traffic_bus is None or not main_loop or not main_loop.is_running():
+        return
+    main_loop.call_soon_threadsafe(_publish_traffic, data)
+
+
+def _publish_traffic(data: dict):
+    """Queue a traffic event for traffic_fanout (runs on the event loop)"""
+    try:
+        traffic_bus.put_nowait(data)
+    except asyncio.QueueFull:
+        pass  # Live view only; drop the event rather than buffer without bound
+
+
+async def traffic_fanout():
+    """Serialize each traffic event once and queue it for every /ws/traffic client"""
+    logger.debug("Traffic fan-out started")
+    while True:
+        data = await traffic_bus.get()
+        if not traffic_queues:
+            continue
+        payload = dumps_json(data)
+        for queue in traffic_queues.values():
+            _put_drop_oldest(queue, payload)
+
+
+traffic_monitor.add_callback(broadcast_traffic)
 
 
 # ===== BACKGROUND TASKS =====
 
+# Bounds for the timeout checker's sleep: never spin, and re-check at least this often
+QUEUE_TIMEOUT_MIN_DELAY = 0.5
+QUEUE_TIMEOUT_MAX_DELAY = 60.0
+# Set by queue_manager notifications so the checker re-plans when users join/leave.
+# Created by queue_timeout_checker on the running loop (3.8/3.9 bind Events at creation)
+_queue_changed: Optional[asyncio.Event] = None
+
+
+async def _wake_timeout_checker(state: dict):
+    """queue_manager callback: the set of deadlines may have changed"""
+    if _queue_changed is not None:
+        _queue_changed.set()
+
+
+queue_manager.add_callback(_wake_timeout_checker)
+
+
 # queue_timeout_checker is called from lifespan
 async def queue_timeout_checker():
-    """Periodically check for timed out queue users"""
+    """Expire queue users whose heartbeats stopped, waking only when the next one is due"""
+    global _queue_changed
+    _queue_changed = asyncio.Event()
     logger.debug("Queue timeout checker started")
     while True:
         try:
-            await asyncio.sleep(10)  # Check every 10 seconds
-            queue_manager.check_timeouts()
+            next_due = queue_manager.check_timeouts()
+            delay = QUEUE_TIMEOUT_MAX_DELAY if next_due is None else next_due
+            delay = min(max(QUEUE_TIMEOUT_MIN_DELAY, delay), QUEUE_TIMEOUT_MAX_DELAY)
+            _queue_changed.clear()
+            try:
+                await asyncio.wait_for(_queue_changed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
         except asyncio.CancelledError:
             logger.debug("Queue timeout checker cancelled")
             break
         except Exception as e:
-            logger.error(f"Error in queue_timeout_checker: {e}")
-            logger.error(traceback.format_exc())
+            logger.exception("Error in queue_timeout_checker: %s", e)
+            await asyncio.sleep(QUEUE_TIMEOUT_MIN_DELAY)
+
+
+async def traffic_drain():
+    """Record queued traffic events off the request path, in batches"""
+    logger.debug("Traffic drain started")
+    while True:
+        event = await traffic_queue.get()
+        batch = [event]
+        while len(batch) < TRAFFIC_DRAIN_BATCH:
+            try:
+                batch.append(traffic_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        for event in batch:
+            try:
+                traffic_monitor.log_request(**event)
+            except Exception as e:
+                logger.error(f"Error recording traffic event: {e}")
+            finally:
+                traffic_queue.task_done()
+
+
+
+async def heartbeat_flush():
+    """Apply buffered heartbeats to queue_manager in one pass per interval"""
+    global _heartbeat_buf
+    logger.debug("Heartbeat flush started")
+    try:
+        while True:
+            await asyncio.sleep(HEARTBEAT_FLUSH_INTERVAL)
+            if _heartbeat_buf:
+                snapshot, _heartbeat_buf = _heartbeat_buf, {}
+                try:
+                    queue_manager.apply_heartbeats(snapshot)
+                except Exception as e:
+                    logger.exception("Error applying heartbeats: %s", e)
+    finally:
+        # Don't lose the last interval's heartbeats on shutdown
+        queue_manager.apply_heartbeats(_heartbeat_buf)
 
 
 # ===== ROOT ENDPOINT =====
@@ -982,10 +1311,10 @@ async def root(request: Request):
     - If Host is a tunnel (ngrok/cloudflare/lan), PROXY to target app.
     - If Host is localhost (127.0.0.1/localhost), SERVE BACKENDBUDDY DASHBOARD.
     """
-    host = request.headers.get("host", "").split(":")[0]
+    host = request.headers.get("host", "").partition(":")[0]
     
     # Check if this is a tunnel or LAN access (anything NOT localhost)
-    is_tunnel_or_lan = host not in ["127.0.0.1", "localhost", "::1"]
+    is_tunnel_or_lan = host not in _LOCAL_HOSTS
     
     if is_tunnel_or_lan:
         logger.info(f"Tunnel/LAN access detected on host {host} - Proxying to target app")
@@ -1017,12 +1346,54 @@ def get_queue_status(session_id: str):
 
 # ===== REVERSE PROXY ENDPOINT =====
 
-import requests
+import httpx
 import os as os_module
+from starlette.background import BackgroundTask
+from fastapi.responses import StreamingResponse
+
+# Shared upstream client: keeps connections to the target app alive (created in lifespan)
+proxy_client: Optional[httpx.AsyncClient] = None
+
+# Relay upstream bodies in fixed-size chunks so memory per request stays constant
+PROXY_CHUNK_SIZE = 64 * 1024
+
+# Hop-by-hop headers that belong to each connection, not the proxied message
+_HOP_BY_HOP_HEADERS = frozenset({'connection', 'keep-alive', 'transfer-encoding', 'te', 'upgrade',
+                                 'proxy-authenticate', 'proxy-authorization', 'trailer'})
+# Request keeps content-length (the streamed body relies on it); response drops it since it's re-chunked
+_REQUEST_SKIP_HEADERS = _HOP_BY_HOP_HEADERS | {'host'}
+_RESPONSE_SKIP_HEADERS = _HOP_BY_HOP_HEADERS | {'content-length'}
 
 # Get the directory where main.py is located
 STATIC_DIR = os_module.path.join(os_module.path.dirname(__file__), "static")
 
+# Waiting room page, read once and split at </head> for the session ID injection.
+# Set BACKENDBUDDY_DEV=true to re-read it when the file changes.
+WAITING_ROOM_PATH = os_module.path.join(STATIC_DIR, "waiting_room.html")
+WAITING_ROOM_RELOAD = os_module.environ.get("BACKENDBUDDY_DEV", "false").lower() == "true"
+_waiting_room_cache: Optional[tuple] = None  # (mtime, head, tail)
+
+
+def _waiting_room_parts() -> tuple:
+    """(bytes before </head>, bytes from </head> on); raises FileNotFoundError if missing"""
+    global _waiting_room_cache
+    cached = _waiting_room_cache
+    if cached is not None and not WAITING_ROOM_RELOAD:
+        return cached[1], cached[2]
+    mtime = os_module.stat(WAITING_ROOM_PATH).st_mtime
+    if cached is None or cached[0] != mtime:
+        with open(WAITING_ROOM_PATH, "rb") as f:
+            html = f.read()
+        index = html.find(b"</head>")
+        if index < 0:
+            index = len(html)
+        cached = _waiting_room_cache = (mtime, html[:index], html[index:])
+    return cached[1], cached[2]
+
+
+# Config snapshot queue_manager was last configured from
+_queue_config_snapshot: Optional[ProjectConfig] = None
+
 # Proxy routes - catch the main preview path AND common static asset paths
 @app.api_route("/preview/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"])
 @app.api_route("/preview", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"])
@@ -1037,22 +1408,21 @@ async def proxy_to_target(request: Request, path: str = ""):
     Reverse proxy to the target application.
     Enforces waiting room queue before allowing access.
     """
-    # Get config from database
-    db = next(get_db())
-    try:
-        config = db.query(ProjectConfig).first()
-        if not config:
-            return JSONResponse(status_code=503, content={"error": "No project configured"})
-        
-        target_port = config.port
-        queue_enabled = config.queue_enabled
+    # Get config (cached, reloaded after writes)
+    config = await get_async_project_config()
+    if not config:
+        return DefaultResponse(status_code=503, content={"error": "No project configured"})
+    
+    target_port = config.port
+    queue_enabled = config.queue_enabled
+    
+    # Configure queue manager only when a new config snapshot appears
+    global _queue_config_snapshot
+    if _queue_config_snapshot is not config:
         max_concurrent = config.max_concurrent_users or 1
         prioritize_localhost = config.prioritize_localhost if config.prioritize_localhost is not None else True
-        
-        # Configure queue manager with latest settings
         queue_manager.configure(max_concurrent=max_concurrent, prioritize_localhost=prioritize_localhost)
-    finally:
-        db.close()
+        _queue_config_snapshot = config
     
     # Get client info
     client_ip = request.client.host if request.client else "unknown"
@@ -1061,18 +1431,18 @@ async def proxy_to_target(request: Request, path: str = ""):
     forwarded_for = request.headers.get("x-forwarded-for", "")
     if forwarded_for:
         # Use the first IP in the chain (original client)
-        real_ip = forwarded_for.split(",")[0].strip()
-        is_localhost = real_ip in ("127.0.0.1", "localhost", "::1")
+        real_ip = forwarded_for.partition(",")[0].strip()
+        is_localhost = real_ip in _LOCAL_HOSTS
         logger.debug(f"Proxy request from {client_ip}, X-Forwarded-For: {forwarded_for}, real_ip: {real_ip}, is_localhost: {is_localhost}")
     else:
-        is_localhost = client_ip in ("127.0.0.1", "localhost", "::1")
+        is_localhost = client_ip in _LOCAL_HOSTS
         logger.debug(f"Proxy request from {client_ip}, is_localhost: {is_localhost}")
     
     # Get or create session ID from cookie
     session_id = request.cookies.get("bb_session_id")
     new_session = False
     if not session_id:
-        session_id = str(uuid.uuid4())
+        session_id = new_session_id()
         new_session = True
         logger.debug(f"New session created: {session_id}")
     else:
@@ -1086,17 +1456,15 @@ async def proxy_to_target(request: Request, path: str = ""):
         
         if queue_result["status"] != "active":
             # User is waiting - serve waiting room
-            waiting_room_path = os_module.path.join(STATIC_DIR, "waiting_room.html")
             try:
-                with open(waiting_room_path, "r", encoding="utf-8") as f:
-                    html_content = f.read()
+                head, tail = _waiting_room_parts()
                 
-                # Inject session ID into the HTML so JavaScript can access it
-                # Replace a placeholder or inject before </head>
-                injection_script = f'<script>window.BB_SESSION_ID = "{session_id}";</script>'
-                html_content = html_content.replace('</head>', f'{injection_script}</head>')
+                # Inject session ID into the HTML so JavaScript can access it (before </head>).
+                # The cookie value is client-supplied, so emit it as an escaped JS string literal.
+                session_literal = json.dumps(session_id).replace("<", "\\u003c")
+                injection_script = f'<script>window.BB_SESSION_ID = {session_literal};</script>'.encode()
                 
-                response = HTMLResponse(content=html_content, status_code=200)
+                response = HTMLResponse(content=head + injection_script + tail, status_code=200)
                 # Set session cookie (httponly for security, JS uses injected var)
                 response.set_cookie(
                     key="bb_session_id",
@@ -1107,7 +1475,7 @@ async def proxy_to_target(request: Request, path: str = ""):
                 )
                 return response
             except FileNotFoundError:
-                return JSONResponse(
+                return DefaultResponse(
                     status_code=503, 
                     content={
                         "error": "Waiting room not available",
@@ -1115,8 +1483,8 @@ async def proxy_to_target(request: Request, path: str = ""):
                     }
                 )
         
-        # User is active - update heartbeat
-        queue_manager.heartbeat(session_id)
+        # User is active - update heartbeat (buffered, see heartbeat_flush)
+        _heartbeat_buf[session_id] = time_module.monotonic()
     
     # Forward request to target application
     # Use 127.0.0.1 instead of localhost to avoid IPv6 resolution issues
@@ -1135,40 +1503,32 @@ async def proxy_to_target(request: Request, path: str = ""):
     logger.info(f"Proxying to target: {target_url}")
     
     try:
-        # Get request body
-        body = await request.body()
-        
-        # Forward headers (excluding host)
-        forward_headers = {}
-        for key, value in request.headers.items():
-            if key.lower() not in ('host', 'content-length'):
-                forward_headers[key] = value
+        # Forward headers (excluding host); the body is streamed, not buffered
+        # ASGI header names are already lowercase
+        forward_headers = {k: v for k, v in request.headers.items() if k not in _REQUEST_SKIP_HEADERS}
+        has_body = 'content-length' in request.headers or 'transfer-encoding' in request.headers
         
         # Make request to target
-        resp = requests.request(
-            method=request.method,
-            url=target_url,
+        upstream_request = proxy_client.build_request(
+            request.method,
+            target_url,
             headers=forward_headers,
-            data=body,
-            allow_redirects=False,
-            timeout=30
+            content=request.stream() if has_body else None
         )
+        resp = await proxy_client.send(upstream_request, stream=True)
         
-        # Build response headers
-        excluded_headers = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
-        response_headers = {}
-        for key, value in resp.headers.items():
-            if key.lower() not in excluded_headers:
-                response_headers[key] = value
+        # Build response headers; raw bytes are relayed, so content-encoding stays
+        response_headers = {k: v for k, v in resp.headers.items() if k.lower() not in _RESPONSE_SKIP_HEADERS}
         
-        logger.info(f"Target responded: status={resp.status_code}, content_type={resp.headers.get('content-type')}, size={len(resp.content)} bytes")
+        logger.info(f"Target responded: status={resp.status_code}, content_type={resp.headers.get('content-type')}, size={resp.headers.get('content-length', 'streamed')}")
         
         # Create response
-        response = Response(
-            content=resp.content,
+        response = StreamingResponse(
+            resp.aiter_raw(chunk_size=PROXY_CHUNK_SIZE),
             status_code=resp.status_code,
             headers=response_headers,
-            media_type=resp.headers.get('content-type')
+            media_type=resp.headers.get('content-type'),
+            background=BackgroundTask(resp.aclose)
         )
         
         # Set session cookie if new
@@ -1183,21 +1543,20 @@ async def proxy_to_target(request: Request, path: str = ""):
         
         return response
         
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         logger.error(f"Connection error to target: {target_url}")
-        return JSONResponse(
+        return DefaultResponse(
             status_code=502, 
             content={"error": "Target application not responding", "target": target_url}
         )
-    except requests.exceptions.Timeout:
-        return JSONResponse(
+    except httpx.TimeoutException:
+        return DefaultResponse(
             status_code=504,
             content={"error": "Target application timeout"}
         )
     except Exception as e:
-        logger.error(f"Proxy error: {e}")
-        logger.error(traceback.format_exc())
-        return JSONResponse(
+        logger.exception("Proxy error: %s", e)
+        return DefaultResponse(
             status_code=502, 
             content={"error": "Bad Gateway", "details": str(e)}
         )
@@ -1214,15 +1573,17 @@ if __name__ == "__main__":
     
     ssl_keyfile = None
     ssl_certfile = None
+    ssl_ciphers = "TLSv1"  # uvicorn default
     
     if use_https:
         logger.info("HTTPS MODE ENABLED")
         try:
-            from cert_utils import get_ssl_context
+            from cert_utils import get_ssl_context, SSL_CIPHERS
             cert, key = get_ssl_context()
             if cert and key:
                 ssl_certfile = cert
                 ssl_keyfile = key
+                ssl_ciphers = SSL_CIPHERS
                 logger.info(f"Using cert: {cert}, key: {key}")
             else:
                 logger.error("Failed to generate/load certificates. Falling back to HTTP.")
@@ -1232,8 +1593,17 @@ if __name__ == "__main__":
     uvicorn.run(
         app, 
         host="0.0.0.0", 
-        port=1338, 
-        log_level="debug",
+        port=network_manager.proxy_port, 
+        # Follow BACKENDBUDDY_LOG_LEVEL instead of forcing uvicorn's debug logging
+        log_level=logging.getLevelName(_log_level).lower(),
+        # "auto" picks uvloop when installed (no Windows build) and falls back to asyncio
+        loop="auto",
+        # Likewise httptools (C parser) when installed, else the pure-Python h11
+        http="auto",
+        # Keep uvicorn's own dictConfig from installing direct stream handlers;
+        # its loggers propagate to the root queue handler instead
+        log_config=None,
         ssl_keyfile=ssl_keyfile,
-        ssl_certfile=ssl_certfile
+        ssl_certfile=ssl_certfile,
+        ssl_ciphers=ssl_ciphers
     )
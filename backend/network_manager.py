@@ -1,4 +1,5 @@
 import subprocess
+import asyncio
 import platform
 import shutil
 import re
@@ -6,14 +7,30 @@ import time
 import logging
 import traceback
 import socket
+import threading
 import requests
 from typing import Optional, Dict, List
 
 # Set up logging
 logger = logging.getLogger("BackendBuddy.NetworkManager")
 
-from database import get_db, ProjectConfig
+from database import get_async_project_config
 
+# Port BackendBuddy itself (API + queue proxy) listens on; tunnels target it when the queue is on
+PROXY_PORT = 1338
+
+# Seconds a detected LAN IP list is reused before scanning interfaces again
+LAN_IP_TTL = 30.0
+
+# ngrok's local inspection API, polled until the tunnel is up
+NGROK_API_URL = "http://localhost:4040/api/tunnels"
+NGROK_STARTUP_TIMEOUT = 5.0
+
+# Public URL printed by cloudflared quick tunnels
+CLOUDFLARE_URL_RE = re.compile(rb'https://[a-zA-Z0-9-]+\.trycloudflare\.com')  # matched on raw output bytes
+# cloudflared output is scanned in raw chunks; the carried tail covers a URL split across two reads
+CLOUDFLARE_READ_SIZE = 8192
+CLOUDFLARE_SCAN_TAIL = 128
 
 
 class NetworkManager:
@@ -22,11 +39,37 @@ class NetworkManager:
     def __init__(self):
         self.ngrok_process: Optional[subprocess.Popen] = None
         self.ngrok_url: Optional[str] = None
-        self.cloudflare_process: Optional[subprocess.Popen] = None
+        self.ngrok_error: Optional[str] = None  # why the last start failed; cleared on the next start
+        self.cloudflare_process: Optional[asyncio.subprocess.Process] = None
         self.cloudflare_url: Optional[str] = None
+        # Interface scan is cached briefly; /api/links is polled by the dashboard
+        self._lan_ips: List[str] = []
+        self._lan_ips_at = 0.0
+        self._lan_lock = threading.Lock()
+        self.proxy_port = PROXY_PORT
+        self._cf_reader: Optional[asyncio.Task] = None  # drains cloudflared output
+        self._ngrok_discovery: Optional[asyncio.Task] = None  # polls the ngrok API after start
+        # Reused for ngrok API polling (keep-alive instead of a new connection per attempt);
+        # its pooled sockets are closed whenever the ngrok process goes away
+        self._ngrok_http = requests.Session()
         logger.debug("NetworkManager initialized")
     
-    def get_lan_ips(self) -> List[str]:
+    def get_lan_ips(self, ttl: float = LAN_IP_TTL) -> List[str]:
+        """LAN IP addresses for this machine, re-detected at most every ttl seconds"""
+        with self._lan_lock:
+            now = time.monotonic()
+            if not self._lan_ips_at or now - self._lan_ips_at > ttl:
+                self._lan_ips = self._detect_lan_ips()
+                self._lan_ips_at = now
+            return list(self._lan_ips)
+    
+    def refresh_lan_ips(self) -> List[str]:
+        """Force a fresh interface scan (e.g. after a network change)"""
+        with self._lan_lock:
+            self._lan_ips_at = 0.0
+        return self.get_lan_ips()
+    
+    def _detect_lan_ips(self) -> List[str]:
         """Auto-detect all LAN IP addresses for this machine"""
         logger.debug("Auto-detecting LAN IP addresses")
         ips = []
@@ -86,8 +129,27 @@ class NetworkManager:
         
         return links
     
-    def start_ngrok(self, port: int) -> Dict:
-        """Start ngrok tunnel"""
+    def configure_proxy_port(self, port: int):
+        """Set the port BackendBuddy's proxy is served on (the queue-enabled tunnel target)"""
+        self.proxy_port = port
+        logger.info(f"Tunnels will target the BackendBuddy proxy on port {port} when the queue is enabled")
+    
+    async def _tunnel_target_port(self, port: int) -> int:
+        """Port a tunnel should expose: the BackendBuddy proxy when the queue is on, else the app"""
+        # Cached config snapshot (invalidated on config writes), so no DB session per tunnel start
+        try:
+            config = await get_async_project_config()
+        except Exception as e:
+            logger.error(f"Error checking queue config: {e}")
+            return port
+        if config and config.queue_enabled:
+            logger.info(f"Queue enabled: Tunneling Traffic through BackendBuddy Proxy ({self.proxy_port})")
+            return self.proxy_port  # Use proxy port
+        logger.info(f"Queue disabled: Tunneling directly to target port ({port})")
+        return port
+    
+    async def start_ngrok(self, port: int) -> Dict:
+        """Start ngrok tunnel; the public URL is discovered in the background"""
         logger.info(f"Starting ngrok on port {port}")
         
         if self.ngrok_process:
@@ -98,27 +160,19 @@ class NetworkManager:
                     "url": self.ngrok_url, 
                     "message": "ngrok already running"
                 }
+            elif self.ngrok_process.poll() is None and self._ngrok_discovery and not self._ngrok_discovery.done():
+                logger.info("ngrok is already starting")
+                return {"success": True, "url": None, "status": "starting", "message": "ngrok starting"}
             else:
-                # Process is dead but object exists, clean up
+                # Dead, or alive without a tunnel: make sure it is gone so the new one gets port 4040
+                await asyncio.get_running_loop().run_in_executor(None, self._reap_ngrok, self.ngrok_process)
                 self.ngrok_process = None
                 self.ngrok_url = None
         
+        self.ngrok_error = None
         try:
             # Determine port based on configuration
-            target_port = port  # Default to requested port
-            
-            # Check if queue is enabled via DB
-            try:
-                db = next(get_db())
-                config = db.query(ProjectConfig).first()
-                if config and config.queue_enabled:
-                    target_port = 1338  # Use proxy port
-                    logger.info("Queue enabled: Tunneling Traffic through BackendBuddy Proxy (1338)")
-                else:
-                    logger.info(f"Queue disabled: Tunneling directly to target port ({port})")
-                db.close()
-            except Exception as e:
-                logger.error(f"Error checking DB for queue config: {e}")
+            target_port = await self._tunnel_target_port(port)
                 
             logger.debug(f"Executing: ngrok http {target_port}")
             self.ngrok_process = subprocess.Popen(
@@ -128,39 +182,9 @@ class NetworkManager:
             )
             logger.debug(f"ngrok process started with PID: {self.ngrok_process.pid}")
             
-            # Wait for ngrok to start and get URL
-            logger.debug("Waiting 2 seconds for ngrok to start...")
-            time.sleep(2)
-            
-            # Query ngrok API for tunnel URL
-            logger.debug("Querying ngrok API at http://localhost:4040/api/tunnels")
-            try:
-                response = requests.get("http://localhost:4040/api/tunnels", timeout=5)
-                logger.debug(f"ngrok API response status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    logger.debug(f"ngrok API response: {data}")
-                    tunnels = data.get("tunnels", [])
-                    if tunnels:
-                        self.ngrok_url = tunnels[0].get("public_url", "")
-                        logger.info(f"ngrok tunnel established: {self.ngrok_url}")
-                        return {
-                            "success": True,
-                            "url": self.ngrok_url,
-                            "message": "ngrok started successfully"
-                        }
-                    else:
-                        logger.warning("No tunnels found in ngrok API response")
-                else:
-                    logger.warning(f"ngrok API returned status {response.status_code}")
-            except requests.RequestException as e:
-                logger.error(f"Failed to query ngrok API: {e}")
-            
-            return {
-                "success": False,
-                "message": "Failed to retrieve ngrok URL. Is ngrok running?"
-            }
+            # Answer now; /api/links picks up ngrok_url once the tunnel is up
+            self._ngrok_discovery = asyncio.create_task(self._discover_ngrok_url(self.ngrok_process))
+            return {"success": True, "url": None, "status": "starting", "message": "ngrok starting"}
             
         except FileNotFoundError:
             logger.error("ngrok executable not found")
@@ -173,6 +197,61 @@ class NetworkManager:
             logger.error(traceback.format_exc())
             return {"success": False, "message": f"Failed to start ngrok: {str(e)}"}
     
+    async def _discover_ngrok_url(self, process: subprocess.Popen):
+        """Poll the ngrok API right away, backing off, until a tunnel shows up"""
+        logger.debug(f"Polling ngrok API at {NGROK_API_URL}")
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + NGROK_STARTUP_TIMEOUT
+        delay = 0.05
+        while time.monotonic() < deadline:
+            if self.ngrok_process is not process:
+                return  # Stopped (or replaced) while starting
+            if process.poll() is not None:
+                await self._fail_ngrok(process, f"ngrok exited during startup with code {process.returncode}")
+                return
+            try:
+                response = await loop.run_in_executor(
+                    None, lambda: self._ngrok_http.get(NGROK_API_URL, timeout=1)
+                )
+                if response.status_code == 200:
+                    tunnels = response.json().get("tunnels", [])
+                    if tunnels and self.ngrok_process is process:
+                        self.ngrok_url = tunnels[0].get("public_url", "")
+                        logger.info(f"ngrok tunnel established: {self.ngrok_url}")
+                        return
+                else:
+                    logger.debug(f"ngrok API returned status {response.status_code}")
+            except requests.RequestException as e:
+                logger.debug(f"ngrok API not ready yet: {e}")  # Not listening yet; retry
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 0.25)
+        
+        await self._fail_ngrok(process, "Timed out waiting for an ngrok tunnel")
+    
+    async def _fail_ngrok(self, process: subprocess.Popen, reason: str):
+        """Record a failed ngrok start and make sure its process is gone (if still current)"""
+        if self.ngrok_process is not process:
+            return
+        logger.error(reason)
+        await asyncio.get_running_loop().run_in_executor(None, self._reap_ngrok, process)
+        if self.ngrok_process is process:
+            self.ngrok_process = None
+            self.ngrok_url = None
+            self.ngrok_error = reason
+            self._ngrok_http.close()
+    
+    def _reap_ngrok(self, process: subprocess.Popen):
+        """Terminate (then kill) an ngrok process and wait for it to exit"""
+        if process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            logger.warning("ngrok did not terminate in time, killing")
+            process.kill()
+            process.wait()
+    
     def stop_ngrok(self) -> Dict:
         """Stop ngrok tunnel"""
         logger.info("Stopping ngrok")
@@ -187,6 +266,7 @@ class NetworkManager:
             self.ngrok_process.wait(timeout=5)
             self.ngrok_process = None
             self.ngrok_url = None
+            self._ngrok_http.close()
             logger.info("ngrok stopped successfully")
             return {"success": True, "message": "ngrok stopped successfully"}
         except subprocess.TimeoutExpired:
@@ -195,6 +275,7 @@ class NetworkManager:
                 self.ngrok_process.kill()
                 self.ngrok_process = None
                 self.ngrok_url = None
+                self._ngrok_http.close()
             except Exception as e:
                 logger.error(f"Failed to kill ngrok: {e}")
             return {"success": True, "message": "ngrok killed"}
@@ -202,12 +283,12 @@ class NetworkManager:
             logger.error(f"Failed to stop ngrok: {e}")
             logger.error(traceback.format_exc())
 
-    def start_cloudflare(self, port: int):
-        """Start cloudflared tunnel"""
+    async def start_cloudflare(self, port: int):
+        """Start cloudflared tunnel (output is scanned by a task on the running event loop)"""
         logger.info(f"Starting cloudflared on port {port}")
         
         if self.cloudflare_process:
-            if self.cloudflare_process.poll() is None and self.cloudflare_url:
+            if self.cloudflare_process.returncode is None and self.cloudflare_url:
                  logger.info(f"cloudflared already running at {self.cloudflare_url}")
                  return {
                      "success": True, 
@@ -215,71 +296,33 @@ class NetworkManager:
                      "message": "cloudflared already running"
                  }
             else:
-                self.stop_cloudflare()
+                await self.stop_cloudflare()
             
         try:
             # Check if cloudflared is installed
-            if not shutil.which("cloudflared"):
+            cloudflared = shutil.which("cloudflared")
+            if not cloudflared:
                 return {"success": False, "message": "cloudflared not found in PATH"}
 
             # Determine port based on configuration
-            target_port = port  # Default to requested port
-            
-            # Check if queue is enabled via DB
-            try:
-                db = next(get_db())
-                config = db.query(ProjectConfig).first()
-                if config and config.queue_enabled:
-                    target_port = 1338  # Use proxy port
-                    logger.info("Queue enabled: Tunneling Traffic through BackendBuddy Proxy (1338)")
-                else:
-                    logger.info(f"Queue disabled: Tunneling directly to target port ({port})")
-                db.close()
-            except Exception as e:
-                logger.error(f"Error checking DB for queue config: {e}")
+            target_port = await self._tunnel_target_port(port)
 
-            # Start process
-            cmd = f"cloudflared tunnel --url http://127.0.0.1:{target_port}"
-            self.cloudflare_process = subprocess.Popen(
-                cmd,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
+            # Start process (no shell: arguments are passed straight through)
+            self.cloudflare_process = await asyncio.create_subprocess_exec(
+                cloudflared, "tunnel", "--url", f"http://127.0.0.1:{target_port}",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
             )
             
-            # Find URL in output
-            url_found = False
-            start_time = time.time()
-            
-            # We need to read lines without blocking forever
-            import threading
-            
-            def scan_logs():
-                nonlocal url_found
-                try:
-                    for line in iter(self.cloudflare_process.stdout.readline, ''):
-                        if not line: break
-
-                        
-                        # Look for trycloudflare.com URL
-                        # Example: https://random-name.trycloudflare.com
-                        match = re.search(r'https://[a-zA-Z0-9-]+\.trycloudflare\.com', line)
-                        if match:
-                            self.cloudflare_url = match.group(0)
-                            logger.info(f"Cloudflare URL found: {self.cloudflare_url}")
-                            url_found = True
-                            # Keep reading to prevent buffer fill, but we found what we needed
-                except Exception as e:
-                    logger.error(f"Error scanning cloudflare logs: {e}")
-
-            t = threading.Thread(target=scan_logs, daemon=True)
-            t.start()
+            # Set by the scanner as soon as the URL is seen (or the output ends)
+            ready = asyncio.Event()
+            self._cf_reader = asyncio.create_task(self._scan_cloudflare_logs(self.cloudflare_process, ready))
             
             # Wait for URL up to 10 seconds
-            while not url_found and time.time() - start_time < 10:
-                time.sleep(0.5)
+            try:
+                await asyncio.wait_for(ready.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                pass
                 
             if self.cloudflare_url:
                 return {"success": True, "message": f"Cloudflare tunnel started: {self.cloudflare_url}", "url": self.cloudflare_url}
@@ -291,18 +334,62 @@ class NetworkManager:
             logger.error(traceback.format_exc())
             return {"success": False, "message": str(e)}
 
-    def stop_cloudflare(self):
+    async def _scan_cloudflare_logs(self, process, ready: asyncio.Event):
+        """Read cloudflared output until it exits, recording the public URL once seen"""
+        tail = b""
+        try:
+            while True:
+                chunk = await process.stdout.read(CLOUDFLARE_READ_SIZE)
+                if not chunk: break
+                if ready.is_set():
+                    continue  # Keep reading to prevent buffer fill, but we found what we needed
+                
+                # Look for trycloudflare.com URL
+                # Example: https://random-name.trycloudflare.com
+                data = tail + chunk
+                match = CLOUDFLARE_URL_RE.search(data)
+                if match and match.end() < len(data):
+                    self.cloudflare_url = match.group(0).decode("ascii")
+                    logger.info(f"Cloudflare URL found: {self.cloudflare_url}")
+                    ready.set()
+                else:
+                    # No (complete) URL yet: keep the end in case it continues in the next read
+                    tail = data[-CLOUDFLARE_SCAN_TAIL:]
+            # Output ended right after a URL
+            match = None if ready.is_set() else CLOUDFLARE_URL_RE.search(tail)
+            if match:
+                self.cloudflare_url = match.group(0).decode("ascii")
+                logger.info(f"Cloudflare URL found: {self.cloudflare_url}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error scanning cloudflare logs: {e}")
+        finally:
+            # Process exited without a URL: don't make the caller wait out the timeout
+            ready.set()
+
+    async def stop_cloudflare(self):
         """Stop cloudflared tunnel"""
         if not self.cloudflare_process:
             return
             
         try:
             logger.info("Stopping cloudflared...")
-            self.cloudflare_process.terminate()
-            try:
-                self.cloudflare_process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                self.cloudflare_process.kill()
+            process = self.cloudflare_process
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+            if self._cf_reader:
+                # The pipe hits EOF once the process is gone; let the reader finish so the transport closes
+                try:
+                    await asyncio.wait_for(self._cf_reader, timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                self._cf_reader = None
             
             self.cloudflare_process = None
             self.cloudflare_url = None
@@ -315,15 +402,21 @@ class NetworkManager:
     def get_ngrok_status(self) -> Dict:
         """Get ngrok status"""
         if not self.ngrok_process:
+            if self.ngrok_error:
+                return {"running": False, "url": None, "status": "failed", "error": self.ngrok_error}
             return {"running": False, "url": None}
         
         # Check if process is still alive
         if self.ngrok_process.poll() is not None:
             logger.debug("ngrok process has exited")
+            self.ngrok_error = f"ngrok exited with code {self.ngrok_process.returncode}"
             self.ngrok_process = None
             self.ngrok_url = None
-            return {"running": False, "url": None}
+            self._ngrok_http.close()
+            return {"running": False, "url": None, "status": "failed", "error": self.ngrok_error}
         
+        if not self.ngrok_url and self._ngrok_discovery and not self._ngrok_discovery.done():
+            return {"running": True, "url": None, "status": "starting"}
         return {"running": True, "url": self.ngrok_url}
 
 
@@ -1,21 +1,30 @@
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+from collections import deque
+from itertools import chain
 from dataclasses import dataclass, field
 import uuid
 import asyncio
 import logging
+import sys
+import time
 import traceback
 
 # Set up logging
 logger = logging.getLogger("BackendBuddy.QueueManager")
 
+# Seconds an unchanged queue state snapshot is reused (bounds how stale wait_time can get)
+STATE_CACHE_MAX_AGE = 1.0
 
-@dataclass
+# Slotted instances (no per-user __dict__) where dataclasses support it (3.10+)
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class QueueUser:
     """Represents a user in the queue"""
     session_id: str
-    joined_at: datetime
-    last_heartbeat: datetime
+    joined_at: float  # time.monotonic()
+    last_heartbeat: float  # time.monotonic()
     position: int
     is_active: bool = False
     is_localhost: bool = False
@@ -26,50 +35,83 @@ class QueueManager:
     
     def __init__(self):
         self.active_users: List[QueueUser] = []
-        self.waiting_users: List[QueueUser] = []
+        self.waiting_users: Deque[QueueUser] = deque()  # FIFO; promotion pops from the left
+        # session_id indexes over the two lists (the lists keep ordering; these give O(1) lookup)
+        self._active_by_sid: Dict[str, QueueUser] = {}
+        self._waiting_by_sid: Dict[str, QueueUser] = {}
+        # Waiting positions are renumbered lazily, on the next read after a removal/promotion
+        self._positions_dirty = False
         self.heartbeat_timeout = 30  # seconds
         self.max_concurrent = 1  # default, updated from config
         self.prioritize_localhost = True  # default, updated from config
-        self.callbacks = []  # WebSocket callbacks for queue updates
+        self.callbacks = ()  # WebSocket callbacks for queue updates (immutable snapshot, replaced on add/remove)
+        # Set on every mutation; _notify_loop coalesces bursts into one broadcast. Created by
+        # _notify_loop on the running loop (3.8/3.9 bind Events to the loop current at creation)
+        self._dirty: Optional[asyncio.Event] = None
+        # Last get_queue_state() snapshot; dropped on every mutation and after STATE_CACHE_MAX_AGE
+        self._cached_state: Optional[Dict] = None
+        self._cached_state_at = 0.0
         logger.debug("QueueManager initialized")
     
     def configure(self, max_concurrent: int = 1, prioritize_localhost: bool = True):
         """Update queue settings from config"""
         self.max_concurrent = max(1, max_concurrent)
         self.prioritize_localhost = prioritize_localhost
+        self._cached_state = None
         logger.info(f"QueueManager configured: max_concurrent={self.max_concurrent}, prioritize_localhost={self.prioritize_localhost}")
         
     def add_callback(self, callback):
         """Add a callback for queue updates"""
-        self.callbacks.append(callback)
-        logger.debug(f"Added callback, total callbacks: {len(self.callbacks)}")
+        self.callbacks = self.callbacks + (callback,)
+        logger.debug("Added callback, total callbacks: %d", len(self.callbacks))
     
     def remove_callback(self, callback):
         """Remove a callback"""
         if callback in self.callbacks:
-            self.callbacks.remove(callback)
-            logger.debug(f"Removed callback, total callbacks: {len(self.callbacks)}")
+            self.callbacks = tuple(cb for cb in self.callbacks if cb is not callback)
+            logger.debug("Removed callback, total callbacks: %d", len(self.callbacks))
     
     async def notify_all(self):
         """Notify all callbacks of queue state change"""
         state = self.get_queue_state()
-        logger.debug(f"Notifying {len(self.callbacks)} callbacks of state change")
-        for callback in self.callbacks:
-            try:
-                await callback(state)
-            except Exception as e:
-                logger.error(f"Callback notification failed: {e}")
+        callbacks = self.callbacks
+        logger.debug("Notifying %d callbacks of state change", len(callbacks))
+        results = await asyncio.gather(*(cb(state) for cb in callbacks), return_exceptions=True)
+        for callback, result in zip(callbacks, results):
+            if isinstance(result, Exception):
+                logger.error(f"Callback {getattr(callback, '__name__', callback)!s} notification failed: {result}")
+    
+    async def _notify_loop(self):
+        """Broadcast the queue state once per burst of mutations (started from app lifespan)"""
+        self._dirty = asyncio.Event()
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            await self.notify_all()
     
     def _is_user_active(self, session_id: str) -> bool:
         """Check if a session is in the active users list"""
-        return any(u.session_id == session_id for u in self.active_users)
+        return session_id in self._active_by_sid
     
     def _get_active_user(self, session_id: str) -> Optional[QueueUser]:
         """Get an active user by session_id"""
-        for u in self.active_users:
-            if u.session_id == session_id:
-                return u
-        return None
+        return self._active_by_sid.get(session_id)
+    
+    def _add_active(self, user: QueueUser):
+        self.active_users.append(user)
+        self._active_by_sid[user.session_id] = user
+    
+    def _add_waiting(self, user: QueueUser):
+        self.waiting_users.append(user)
+        self._waiting_by_sid[user.session_id] = user
+    
+    def _remove_active(self, user: QueueUser):
+        self.active_users.remove(user)
+        del self._active_by_sid[user.session_id]
+    
+    def _remove_waiting(self, user: QueueUser):
+        self.waiting_users.remove(user)
+        del self._waiting_by_sid[user.session_id]
     
     def join_queue(self, session_id: Optional[str] = None, is_localhost: bool = False) -> Dict:
         """Add a user to the queue or grant immediate access"""
@@ -78,11 +120,11 @@ class QueueManager:
         # Generate session ID if not provided
         if not session_id:
             session_id = str(uuid.uuid4())
-            logger.debug(f"Generated new session_id: {session_id}")
+            logger.debug("Generated new session_id: %s", session_id)
         
         # Check if user is already active
         if self._is_user_active(session_id):
-            logger.debug(f"User {session_id} is already active")
+            logger.debug("User %s is already active", session_id)
             return {
                 "session_id": session_id,
                 "status": "active",
@@ -91,18 +133,19 @@ class QueueManager:
             }
         
         # Check if user already in waiting queue
-        for user in self.waiting_users:
-            if user.session_id == session_id:
-                logger.debug(f"User {session_id} already in queue at position {user.position}")
-                return {
-                    "session_id": session_id,
-                    "status": "waiting",
-                    "position": user.position,
-                    "queue_length": len(self.waiting_users),
-                    "message": "Already in queue"
-                }
+        existing = self._waiting_by_sid.get(session_id)
+        if existing:
+            position = self._waiting_position(existing)
+            logger.debug("User %s already in queue at position %d", session_id, position)
+            return {
+                "session_id": session_id,
+                "status": "waiting",
+                "position": position,
+                "queue_length": len(self.waiting_users),
+                "message": "Already in queue"
+            }
         
-        now = datetime.utcnow()
+        now = time.monotonic()
         
         # Localhost priority: grant immediate access if enabled
         if is_localhost and self.prioritize_localhost:
@@ -115,7 +158,7 @@ class QueueManager:
                 is_active=True,
                 is_localhost=True
             )
-            self.active_users.append(new_user)
+            self._add_active(new_user)
             self._try_notify()
             return {
                 "session_id": session_id,
@@ -135,7 +178,7 @@ class QueueManager:
                 is_active=True,
                 is_localhost=is_localhost
             )
-            self.active_users.append(new_user)
+            self._add_active(new_user)
             self._try_notify()
             return {
                 "session_id": session_id,
@@ -155,8 +198,8 @@ class QueueManager:
             is_active=False,
             is_localhost=is_localhost
         )
-        self.waiting_users.append(user)
-        self._update_positions()
+        # Appending doesn't move anyone else, so no renumbering needed
+        self._add_waiting(user)
         self._try_notify()
         
         return {
@@ -172,107 +215,150 @@ class QueueManager:
         logger.info(f"leave_queue called for session_id: {session_id}")
         
         # Check if in active users
-        for i, user in enumerate(self.active_users):
-            if user.session_id == session_id:
-                logger.info(f"Active user {session_id} is leaving")
-                self.active_users.pop(i)
-                self._promote_waiting_users()
-                self._try_notify()
-                return {"success": True, "message": "Left active session"}
+        user = self._active_by_sid.get(session_id)
+        if user:
+            logger.info(f"Active user {session_id} is leaving")
+            self._remove_active(user)
+            self._promote_waiting_users()
+            self._try_notify()
+            return {"success": True, "message": "Left active session"}
         
         # Check waiting users
-        for i, user in enumerate(self.waiting_users):
-            if user.session_id == session_id:
-                logger.info(f"Removing waiting user {session_id} from position {user.position}")
-                self.waiting_users.pop(i)
-                self._update_positions()
-                self._try_notify()
-                return {"success": True, "message": "Removed from queue"}
+        user = self._waiting_by_sid.get(session_id)
+        if user:
+            logger.info(f"Removing waiting user {session_id} from the queue")
+            self._remove_waiting(user)
+            self._invalidate_positions()
+            self._try_notify()
+            return {"success": True, "message": "Removed from queue"}
         
         logger.warning(f"Session {session_id} not found in queue")
         return {"success": False, "message": "Session not found"}
     
     def heartbeat(self, session_id: str) -> Dict:
         """Update heartbeat for a user"""
-        now = datetime.utcnow()
+        now = time.monotonic()
         
         # Check active users
-        for user in self.active_users:
-            if user.session_id == session_id:
-                user.last_heartbeat = now
-                logger.debug(f"Heartbeat received from active user {session_id}")
-                return {"success": True, "status": "active", "position": 0}
+        user = self._active_by_sid.get(session_id)
+        if user:
+            user.last_heartbeat = now
+            logger.debug("Heartbeat received from active user %s", session_id)
+            return {"success": True, "status": "active", "position": 0}
         
         # Check waiting users
-        for user in self.waiting_users:
-            if user.session_id == session_id:
-                user.last_heartbeat = now
-                logger.debug(f"Heartbeat received from waiting user {session_id} at position {user.position}")
-                return {
-                    "success": True, 
-                    "status": "waiting", 
-                    "position": user.position,
-                    "queue_length": len(self.waiting_users)
-                }
+        user = self._waiting_by_sid.get(session_id)
+        if user:
+            user.last_heartbeat = now
+            position = self._waiting_position(user)
+            logger.debug("Heartbeat received from waiting user %s at position %d", session_id, position)
+            return {
+                "success": True, 
+                "status": "waiting", 
+                "position": position,
+                "queue_length": len(self.waiting_users)
+            }
         
-        logger.warning(f"Heartbeat from unknown session: {session_id}")
+        logger.warning("Heartbeat from unknown session: %s", session_id)
         return {"success": False, "message": "Session not found"}
     
-    def check_timeouts(self):
-        """Remove users who haven't sent heartbeat - prevents zombies"""
-        now = datetime.utcnow()
-        timeout_threshold = now - timedelta(seconds=self.heartbeat_timeout)
+    def apply_heartbeats(self, heartbeats: Dict[str, float]):
+        """Apply a batch of buffered heartbeat timestamps in one pass over the queue"""
+        if not heartbeats:
+            return
+        for session_id, seen in heartbeats.items():
+            user = self._active_by_sid.get(session_id) or self._waiting_by_sid.get(session_id)
+            if user and seen > user.last_heartbeat:
+                user.last_heartbeat = seen
+        logger.debug("Applied %d buffered heartbeats", len(heartbeats))
+    
+    def check_timeouts(self) -> Optional[float]:
+        """Remove users who haven't sent heartbeat - prevents zombies.
         
-        # Check active users
-        timed_out_active = []
-        for user in self.active_users:
-            if user.last_heartbeat < timeout_threshold:
-                timed_out_active.append(user)
+        Returns seconds until the next user could time out, or None if the queue is empty.
+        """
+        timeout_threshold = time.monotonic() - self.heartbeat_timeout
         
-        for user in timed_out_active:
-            logger.info(f"Active user {user.session_id} timed out (zombie cleanup)")
-            self.active_users.remove(user)
+        # Common case: nobody expired. One allocation-free pass finds the oldest heartbeat and we're done
+        oldest = self._oldest_heartbeat()
+        if oldest is None:
+            return None
+        if oldest >= timeout_threshold:
+            return oldest - timeout_threshold
         
-        # Check waiting users
-        timed_out_waiting = []
-        for user in self.waiting_users:
-            if user.last_heartbeat < timeout_threshold:
-                timed_out_waiting.append(user)
+        # Check active users; survivors are rebuilt in one pass rather than remove() per victim
+        timed_out_active = [u for u in self.active_users if u.last_heartbeat < timeout_threshold]
+        if timed_out_active:
+            self.active_users = [u for u in self.active_users if u.last_heartbeat >= timeout_threshold]
+            for user in timed_out_active:
+                logger.info(f"Active user {user.session_id} timed out (zombie cleanup)")
+                del self._active_by_sid[user.session_id]
         
-        for user in timed_out_waiting:
-            logger.info(f"Waiting user {user.session_id} at position {user.position} timed out")
-            self.waiting_users.remove(user)
+        # Check waiting users
+        timed_out_waiting = [u for u in self.waiting_users if u.last_heartbeat < timeout_threshold]
+        if timed_out_waiting:
+            self.waiting_users = deque(u for u in self.waiting_users if u.last_heartbeat >= timeout_threshold)
+            for user in timed_out_waiting:
+                logger.info(f"Waiting user {user.session_id} timed out")
+                del self._waiting_by_sid[user.session_id]
         
         if timed_out_active or timed_out_waiting:
-            self._update_positions()
+            self._invalidate_positions()
             self._promote_waiting_users()
             self._try_notify()
+        
+        oldest = self._oldest_heartbeat()
+        if oldest is None:
+            return None
+        return max(0.0, oldest - timeout_threshold)
+    
+    def _oldest_heartbeat(self) -> Optional[float]:
+        """Earliest last_heartbeat across active and waiting users"""
+        return min(
+            (u.last_heartbeat for u in chain(self.active_users, self.waiting_users)),
+            default=None
+        )
     
     def _promote_waiting_users(self):
         """Promote waiting users to active if there's room"""
         while len(self.active_users) < self.max_concurrent and self.waiting_users:
-            next_user = self.waiting_users.pop(0)
+            next_user = self.waiting_users.popleft()
+            del self._waiting_by_sid[next_user.session_id]
             next_user.is_active = True
             next_user.position = 0
-            self.active_users.append(next_user)
+            self._add_active(next_user)
+            self._invalidate_positions()
             logger.info(f"Promoted user {next_user.session_id} to active")
-        self._update_positions()
     
-    def _update_positions(self):
-        """Update position numbers for all waiting users"""
+    def _invalidate_positions(self):
+        """Mark waiting positions stale after a user left from anywhere but the back"""
+        self._positions_dirty = True
+    
+    def _refresh_positions(self):
+        """Renumber waiting users if anything changed since the last read"""
+        if not self._positions_dirty:
+            return
         for i, user in enumerate(self.waiting_users):
             user.position = i + 1
-        logger.debug(f"Updated positions for {len(self.waiting_users)} waiting users")
+        self._positions_dirty = False
+        logger.debug("Updated positions for %d waiting users", len(self.waiting_users))
+    
+    def _waiting_position(self, user: QueueUser) -> int:
+        """1-based position of a waiting user (renumbers only if something moved)"""
+        self._refresh_positions()
+        return user.position
     
     def _try_notify(self):
-        """Try to create a notify task, handle case where no event loop"""
-        try:
-            asyncio.create_task(self.notify_all())
-        except Exception as e:
-            logger.debug(f"Could not create notify task (may be sync context): {e}")
+        """Mark the queue state dirty (called after every mutation); _notify_loop picks it up"""
+        self._cached_state = None
+        if self._dirty is not None:  # None until _notify_loop starts; nobody is listening yet
+            self._dirty.set()
     
     def get_queue_state(self) -> Dict:
-        """Get current queue state"""
+        """Get current queue state (a shared snapshot: treat it as read-only)"""
+        now = time.monotonic()
+        if self._cached_state is not None and now - self._cached_state_at < STATE_CACHE_MAX_AGE:
+            return self._cached_state
         state = {
             "active_count": len(self.active_users),
             "max_concurrent": self.max_concurrent,
@@ -281,36 +367,38 @@ class QueueManager:
             "waiting_users": [
                 {
                     "session_id": user.session_id,
-                    "position": user.position,
-                    "wait_time": int((datetime.utcnow() - user.joined_at).total_seconds())
+                    "position": i + 1,
+                    "wait_time": int(now - user.joined_at)
                 }
-                for user in self.waiting_users
+                for i, user in enumerate(self.waiting_users)
             ]
         }
-        logger.debug(f"Queue state: active={state['active_count']}/{state['max_concurrent']}, waiting={state['queue_length']}")
+        logger.debug("Queue state: active=%d/%d, waiting=%d", state["active_count"], state["max_concurrent"], state["queue_length"])
+        self._cached_state = state
+        self._cached_state_at = now
         return state
     
     def get_user_status(self, session_id: str) -> Optional[Dict]:
         """Get status for a specific user"""
         # Check active users
-        for user in self.active_users:
-            if user.session_id == session_id:
-                return {
-                    "session_id": session_id,
-                    "status": "active",
-                    "position": 0
-                }
+        if session_id in self._active_by_sid:
+            return {
+                "session_id": session_id,
+                "status": "active",
+                "position": 0
+            }
         
         # Check waiting users
-        for user in self.waiting_users:
-            if user.session_id == session_id:
-                return {
-                    "session_id": session_id,
-                    "status": "waiting",
-                    "position": user.position,
-                    "queue_length": len(self.waiting_users),
-                    "estimated_wait": user.position * 30  # Rough estimate in seconds
-                }
+        user = self._waiting_by_sid.get(session_id)
+        if user:
+            position = self._waiting_position(user)
+            return {
+                "session_id": session_id,
+                "status": "waiting",
+                "position": position,
+                "queue_length": len(self.waiting_users),
+                "estimated_wait": position * 30  # Rough estimate in seconds
+            }
         
         return None
 
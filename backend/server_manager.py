@@ -3,25 +3,161 @@ import psutil
 import threading
 import queue
 import os
+import select
+import selectors
+import signal
+import time
 import logging
 import traceback
-from typing import Optional, Callable
-from datetime import datetime
+import json
+import shlex
+import re
+from typing import List, Optional, Callable
 from collections import deque
+from itertools import islice
 
 # Set up logging
 logger = logging.getLogger("BackendBuddy.ServerManager")
 
+# POSIX: each started command leads its own session/process group, so stop() signals the
+# whole tree with one killpg(). Elsewhere the tree is walked with psutil.
+_PROCESS_GROUPS = os.name == "posix"
+_POPEN_GROUP_KWARGS = {"start_new_session": True} if _PROCESS_GROUPS else {}
+
+# Shell injection guard for start(): command substitution, pipes, redirects, separators, newlines
+_DANGEROUS_COMMAND_RE = re.compile(r"\$\(|[`|><;\n\r]")
+
+# Anything the shell would interpret beyond word splitting/quoting (chains, globs, variables, ...)
+_SHELL_SYNTAX = set('&|;<>()$`*?[]{}~!#=%^\n')
+
+
+def _command_argv(command: str):
+    """(args, shell) for Popen: exec plain POSIX commands directly, keep the shell otherwise.
+    
+    Without a shell in between, the tracked pid (and process group leader) is the server itself.
+    Windows keeps cmd.exe: npm/npx and friends are .cmd shims that need it.
+    """
+    if os.name != "posix" or any(c in _SHELL_SYNTAX for c in command):
+        return command, True
+    try:
+        args = shlex.split(command)
+    except ValueError:  # e.g. unbalanced quotes: let the shell report it
+        return command, True
+    return (args, False) if args else (command, True)
+
+
+# Bytes read from a dev server's output pipe per os.read()
+LOG_READ_SIZE = 65536
+# Pipes can be multiplexed with a selector on POSIX; Windows select() only takes sockets
+_SELECTABLE_PIPES = os.name == "posix"
+
+
+def _wait_pid_event_driven(procs: List[psutil.Process], timeout: float) -> List[psutil.Process]:
+    """Wait up to timeout for procs to exit; returns the ones still alive.
+    
+    Uses pidfds (Linux 5.3+, Python 3.9+) so the kernel wakes us when a process exits,
+    falling back to psutil's polling wait elsewhere.
+    """
+    fds = {}
+    try:
+        for proc in procs:
+            try:
+                fds[os.pidfd_open(proc.pid, 0)] = proc
+            except ProcessLookupError:
+                pass  # Already gone
+    except (AttributeError, OSError):
+        for fd in fds:
+            os.close(fd)
+        _, alive = psutil.wait_procs(procs, timeout=timeout)
+        return alive
+    
+    try:
+        poller = select.poll()
+        for fd in fds:
+            poller.register(fd, select.POLLIN)
+        deadline = time.monotonic() + timeout
+        while fds:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for fd, _ in poller.poll(remaining * 1000):
+                poller.unregister(fd)
+                os.close(fd)
+                proc = fds.pop(fd)
+                try:
+                    proc.wait(timeout=0)  # Reap it if it is our own child
+                except (psutil.TimeoutExpired, psutil.NoSuchProcess, ChildProcessError):
+                    pass
+    finally:
+        for fd in fds:
+            os.close(fd)
+    return list(fds.values())
+
+
+def _wait_group_gone(pgid: int, timeout: float) -> bool:
+    """Poll until process group pgid has no members left; True if it emptied within timeout"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass  # A member exists but changed credentials; still alive
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+
+# Parse package.json with orjson when installed (both accept raw bytes)
+try:
+    import orjson
+    _loads_json = orjson.loads
+except ImportError:
+    _loads_json = json.loads
+
+# scan_project: how deep below the chosen folder to look, and directories never worth entering
+SCAN_MAX_DEPTH = 2
+SCAN_SKIP_DIRS = ('node_modules', 'venv', '.git', '__pycache__')
+
+
+def _scan_dirs(root_path: str, max_depth: int):
+    """Breadth-first walk yielding (path, {name: DirEntry}) for each directory up to max_depth"""
+    pending = deque([(root_path, 0)])
+    while pending:
+        path, depth = pending.popleft()
+        try:
+            with os.scandir(path) as it:
+                entries = {entry.name: entry for entry in it}
+        except OSError as e:
+            logger.debug("Cannot scan %s: %s", path, e)
+            continue
+        yield path, entries
+        if depth < max_depth:
+            for name, entry in entries.items():
+                # Pruned before descending (substring match, as 'venv' also covers '.venv' etc.)
+                if entry.is_dir() and not any(skip in name for skip in SCAN_SKIP_DIRS):
+                    pending.append((entry.path, depth + 1))
+
 
 class ServerManager:
     """Manages the lifecycle of a single dev server process"""
     
+    __slots__ = ("process", "frontend_process", "pgid", "frontend_pgid", "_started_at",
+                 "log_queue", "log_callbacks", "is_running", "_log_q", "_log_dispatcher")
+    
     def __init__(self):
         self.process: Optional[subprocess.Popen] = None
         self.frontend_process: Optional[subprocess.Popen] = None
+        self.pgid: Optional[int] = None  # process group of self.process (POSIX only)
+        self.frontend_pgid: Optional[int] = None
+        self._started_at: Optional[float] = None  # time.monotonic() when self.process was spawned
         self.log_queue = deque(maxlen=1000)
         self.log_callbacks = []
         self.is_running = False
+        # Raw (prefix, time, [line bytes]) tuples from the _stream_logs readers; _dispatch_logs does the rest
+        self._log_q = queue.SimpleQueue()
+        self._log_dispatcher = threading.Thread(target=self._dispatch_logs, daemon=True)
+        self._log_dispatcher.start()
         logger.debug("ServerManager initialized")
         
     def start(self, directory: str, command: str, frontend_directory: Optional[str] = None, frontend_command: Optional[str] = None, log_callback: Optional[Callable] = None):
@@ -43,11 +179,10 @@ class ServerManager:
                 return {"success": False, "message": f"Path is not a directory: {directory}"}
             
             # Basic command sanitization - block obvious shell injection attempts
-            dangerous_patterns = ['$(', '`', '|', '>', '<', ';', '\n', '\r']
-            for pattern in dangerous_patterns:
-                if pattern in command:
-                    logger.error(f"Dangerous pattern detected in command: {pattern}")
-                    return {"success": False, "message": f"Invalid command: contains forbidden character"}
+            match = _DANGEROUS_COMMAND_RE.search(command)
+            if match:
+                logger.error(f"Dangerous pattern detected in command: {match.group()!r}")
+                return {"success": False, "message": "Invalid command: contains forbidden character"}
             
             logger.debug(f"Directory exists: {directory}")
             logger.debug(f"Starting process with command: {command}")
@@ -62,18 +197,20 @@ class ServerManager:
                 env['PYTHONIOENCODING'] = 'utf-8'
                 env['PYTHONUNBUFFERED'] = '1'
                 
+                args, use_shell = _command_argv(command)
                 self.process = subprocess.Popen(
-                    command,
+                    args,
                     cwd=directory,
-                    shell=True,
+                    shell=use_shell,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1,
+                    bufsize=0,  # raw pipe: _stream_logs reads large chunks and decodes lines itself
                     env=env,
-                    encoding='utf-8',
-                    errors='replace'
+                    **_POPEN_GROUP_KWARGS
                 )
+                # New session: the leader's pid is the group id
+                self.pgid = self.process.pid if _PROCESS_GROUPS else None
+                self._started_at = time.monotonic()
                 
                 logger.info(f"Process started with PID: {self.process.pid}")
                 self.is_running = True
@@ -83,9 +220,7 @@ class ServerManager:
                     self.log_callbacks.append(log_callback)
                     logger.debug(f"Added log callback, total callbacks: {len(self.log_callbacks)}")
                 
-                log_thread = threading.Thread(target=self._stream_logs, args=(self.process, "[Backend] "), daemon=True)
-                log_thread.start()
-                logger.debug("Backend log streaming thread started")
+                streams = [(self.process, "[Backend] ")]
 
                 # Start Frontend Process if configured
                 if frontend_directory and frontend_command:
@@ -100,25 +235,26 @@ class ServerManager:
                         pass
 
                     if os.path.exists(frontend_path):
+                         fe_args, fe_shell = _command_argv(frontend_command)
                          self.frontend_process = subprocess.Popen(
-                            frontend_command,
+                            fe_args,
                             cwd=frontend_path,
-                            shell=True,
+                            shell=fe_shell,
                             stdout=subprocess.PIPE,
                             stderr=subprocess.STDOUT,
-                            text=True,
-                            bufsize=1,
+                            bufsize=0,
                             env=env,
-                            encoding='utf-8',
-                            errors='replace'
+                            **_POPEN_GROUP_KWARGS
                         )
+                         self.frontend_pgid = self.frontend_process.pid if _PROCESS_GROUPS else None
                          logger.info(f"Frontend started with PID: {self.frontend_process.pid}")
-                         fe_log_thread = threading.Thread(target=self._stream_logs, args=(self.frontend_process, "[Frontend] "), daemon=True)
-                         fe_log_thread.start()
+                         streams.append((self.frontend_process, "[Frontend] "))
                     else:
                         logger.warning(f"Frontend directory not found: {frontend_path}")
                         self.log_queue.append(f"[System] [WARNING] Frontend directory not found: {frontend_path}")
                 
+                self._start_log_readers(streams)
+                
                 return {
                     "success": True,
                     "message": "Server(s) started successfully",
@@ -151,6 +287,63 @@ class ServerManager:
             self.is_running = False
             return {"success": False, "message": f"Failed to start server: {str(e)}"}
     
+    def _start_log_readers(self, streams):
+        """Start reading the output of the (process, prefix) streams"""
+        if _SELECTABLE_PIPES:
+            threading.Thread(target=self._io_loop, args=(streams,), daemon=True).start()
+            logger.debug(f"Log streaming thread started for {len(streams)} pipe(s)")
+        else:
+            for process, prefix in streams:
+                threading.Thread(target=self._stream_logs, args=(process, prefix), daemon=True).start()
+            logger.debug(f"Started {len(streams)} log streaming thread(s)")
+    
+    def _io_loop(self, streams):
+        """Drain every stream's pipe from one thread, reading whichever is ready (POSIX)"""
+        backend = streams[0][0]
+        put = self._log_q.put_nowait
+        sel = selectors.DefaultSelector()
+        try:
+            for process, prefix in streams:
+                # data: [prefix, partial last line, line count, process]
+                sel.register(process.stdout, selectors.EVENT_READ, data=[prefix, b"", 0, process])
+            
+            while sel.get_map():
+                for key, _ in sel.select():
+                    state = key.data
+                    prefix, pending, line_count, process = state
+                    chunk = os.read(key.fd, LOG_READ_SIZE)
+                    if chunk:
+                        # Complete lines go to the dispatcher (still as bytes); a partial last line waits for more
+                        *lines, state[1] = (pending + chunk).split(b"\n")
+                        if lines:
+                            state[2] += len(lines)
+                            put((prefix, time.time(), lines))
+                        continue
+                    
+                    # EOF: flush the partial line and stop watching this pipe
+                    if pending:
+                        state[2] += 1
+                        put((prefix, time.time(), [pending]))
+                    sel.unregister(key.fileobj)
+                    logger.info(f"Log streaming ended for {prefix.strip()} after {state[2]} lines")
+                    # A restart may already have spawned the replacement; leave its flag alone
+                    if process is backend and self.process is backend:
+                        logger.debug("Backend output closed, setting is_running=False")
+                        self.is_running = False
+        except Exception as e:
+            logger.error(f"Log streaming failed: {e}")
+            logger.error(traceback.format_exc())
+            error_msg = f"[ERROR] Log streaming failed: {str(e)}"
+            for callback in self.log_callbacks:
+                try:
+                    callback(error_msg)
+                except Exception as cb_error:
+                    logger.error(f"Error callback failed: {cb_error}")
+            if self.process is backend:
+                self.is_running = False
+        finally:
+            sel.close()
+    
     def _stream_logs(self, process: subprocess.Popen, prefix: str = ""):
         """Stream logs from a specific process"""
         logger.debug(f"Log streaming started for {prefix}")
@@ -159,29 +352,24 @@ class ServerManager:
             logger.error(f"No process or stdout to stream from for {prefix}")
             return
         
+        # Only read and hand off here, so the pipe is drained as fast as the process writes
+        put = self._log_q.put_nowait
+        fd = process.stdout.fileno()
         try:
             line_count = 0
-            for line in iter(process.stdout.readline, ''):
-                if not line:
+            pending = b""
+            while True:
+                chunk = os.read(fd, LOG_READ_SIZE)
+                if not chunk:
                     break
-                
+                # Complete lines go to the dispatcher (still as bytes); a partial last line waits for more
+                *lines, pending = (pending + chunk).split(b"\n")
+                if lines:
+                    line_count += len(lines)
+                    put((prefix, time.time(), lines))
+            if pending:
                 line_count += 1
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                log_entry = f"[{timestamp}] {prefix}{line.rstrip()}"
-                
-                # Log every 10th line to avoid spam
-                if line_count <= 5 or line_count % 10 == 0:
-                    logger.debug(f"Log line {line_count}: {log_entry[:100]}...")
-                
-                # Send to all callbacks
-                for callback in self.log_callbacks:
-                    try:
-                        callback(log_entry)
-                    except Exception as e:
-                        logger.error(f"Log callback error: {e}")
-                
-                # Also store in queue for retrieval (deque handles maxlen automatically)
-                self.log_queue.append(log_entry)
+                put((prefix, time.time(), [pending]))
             
             logger.info(f"Log streaming ended after {line_count} lines")
                 
@@ -195,8 +383,48 @@ class ServerManager:
                 except Exception as cb_error:
                     logger.error(f"Error callback failed: {cb_error}")
         finally:
-            logger.debug("Log streaming thread exiting, setting is_running=False")
-            self.is_running = False
+            # Only the current backend's reader owns the flag (not the frontend's, nor a
+            # reader left over from before a restart)
+            if self.process is process:
+                logger.debug("Log streaming thread exiting, setting is_running=False")
+                self.is_running = False
+    
+    def _dispatch_logs(self):
+        """Format, store and fan out queued log lines in batches (single daemon thread)"""
+        stamp_second, stamp = None, ""
+        line_count = 0
+        while True:
+            batch = [self._log_q.get()]
+            while True:
+                try:
+                    batch.append(self._log_q.get_nowait())
+                except queue.Empty:
+                    break
+            
+            callbacks = self.log_callbacks
+            debug = logger.isEnabledFor(logging.DEBUG)  # checked once per batch, not per line
+            for prefix, ts, lines in batch:
+                # The HH:MM:SS stamp only changes once a second
+                second = int(ts)
+                if second != stamp_second:
+                    stamp_second, stamp = second, time.strftime("%H:%M:%S", time.localtime(second))
+                for line in lines:
+                    log_entry = f"[{stamp}] {prefix}{line.decode('utf-8', 'replace').rstrip()}"
+                    
+                    # Log every 10th line to avoid spam
+                    line_count += 1
+                    if debug and (line_count <= 5 or line_count % 10 == 0):
+                        logger.debug("Log line %d: %.100s...", line_count, log_entry)
+                    
+                    # Send to all callbacks
+                    for callback in callbacks:
+                        try:
+                            callback(log_entry)
+                        except Exception as e:
+                            logger.error(f"Log callback error: {e}")
+                    
+                    # Also store in queue for retrieval (deque handles maxlen automatically)
+                    self.log_queue.append(log_entry)
     
     def stop(self):
         """Stop the dev server gracefully"""
@@ -212,35 +440,10 @@ class ServerManager:
             
             parent = psutil.Process(pid)
             
-            # Kill all child processes
-            children = parent.children(recursive=True)
-            logger.debug(f"Found {len(children)} child processes")
-            
-            for child in children:
-                try:
-                    logger.debug(f"Terminating child PID: {child.pid}")
-                    child.terminate()
-                except psutil.NoSuchProcess:
-                    logger.debug(f"Child process {child.pid} already gone")
-                except Exception as e:
-                    logger.error(f"Error terminating child {child.pid}: {e}")
-            
-            # Kill parent
-            logger.debug(f"Terminating parent PID: {pid}")
-            parent.terminate()
-            
-            # Wait for termination
-            try:
-                parent.wait(timeout=5)
-                logger.info(f"Process {pid} terminated gracefully")
-            except psutil.TimeoutExpired:
-                logger.warning(f"Process {pid} did not terminate in time, killing")
-                parent.kill()
-                for child in children:
-                    try:
-                        child.kill()
-                    except Exception as e:
-                        logger.debug(f"Error killing child: {e}")
+            if self.pgid is not None:
+                self._stop_group(parent, self.pgid)
+            else:
+                self._stop_tree(parent)
             
             # Stop Frontend if running
             if self.frontend_process:
@@ -248,15 +451,20 @@ class ServerManager:
                     fe_pid = self.frontend_process.pid
                     logger.debug(f"Stopping frontend PID: {fe_pid}")
                     fe_parent = psutil.Process(fe_pid)
-                    for child in fe_parent.children(recursive=True):
-                        child.terminate()
-                    fe_parent.terminate()
-                    self.frontend_process = None
+                    if self.frontend_pgid is not None:
+                        self._stop_group(fe_parent, self.frontend_pgid)
+                    else:
+                        self._stop_tree(fe_parent)
+                except psutil.NoSuchProcess:
+                    logger.debug("Frontend process already gone")
                 except Exception as e:
                     logger.error(f"Error stopping frontend: {e}")
+                self.frontend_process = None
+                self.frontend_pgid = None
 
             self.is_running = False
             self.process = None
+            self.pgid = None
             
             return {"success": True, "message": "Server stopped successfully"}
             
@@ -264,6 +472,7 @@ class ServerManager:
             logger.warning("Process already terminated")
             self.is_running = False
             self.process = None
+            self.pgid = None
             return {"success": True, "message": "Server already stopped"}
         except Exception as e:
             logger.error(f"Failed to stop server: {e}")
@@ -271,8 +480,69 @@ class ServerManager:
             # Force reset state to avoid getting stuck
             self.is_running = False
             self.process = None
+            self.pgid = None
             return {"success": False, "message": f"Failed to stop server: {str(e)}"}
     
+    def _stop_group(self, parent: psutil.Process, pgid: int):
+        """Terminate a whole process group with one signal, killing it if the leader lingers"""
+        logger.debug(f"Terminating process group {pgid}")
+        deadline = time.monotonic() + 5
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+        except ProcessLookupError:
+            logger.debug(f"Process group {pgid} already gone")
+            return
+        
+        # The leader's exit is event-driven; descendants that outlive it (e.g. vite under
+        # npm) may still hold the port, so the rest of the group is polled until empty
+        if (not _wait_pid_event_driven([parent], timeout=5)
+                and _wait_group_gone(pgid, deadline - time.monotonic())):
+            logger.info(f"Process group {pgid} terminated gracefully")
+            return
+        logger.warning(f"Process group {pgid} did not terminate in time, killing it")
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+        # SIGKILL can't be ignored; just let it land
+        _wait_pid_event_driven([parent], timeout=1)
+        _wait_group_gone(pgid, 1)
+    
+    def _stop_tree(self, parent: psutil.Process):
+        """Terminate a process and its descendants one by one (no process groups, e.g. Windows)"""
+        pid = parent.pid
+        
+        # Kill all child processes
+        children = parent.children(recursive=True)
+        logger.debug(f"Found {len(children)} child processes")
+        
+        for child in children:
+            try:
+                logger.debug(f"Terminating child PID: {child.pid}")
+                child.terminate()
+            except psutil.NoSuchProcess:
+                logger.debug(f"Child process {child.pid} already gone")
+            except Exception as e:
+                logger.error(f"Error terminating child {child.pid}: {e}")
+        
+        # Kill parent
+        logger.debug(f"Terminating parent PID: {pid}")
+        parent.terminate()
+        
+        # Wait for termination (parent and children together, woken as each one exits)
+        alive = _wait_pid_event_driven([parent] + children, timeout=5)
+        if parent not in alive:
+            logger.info(f"Process {pid} terminated gracefully")
+        else:
+            logger.warning(f"Process {pid} did not terminate in time, killing")
+        if alive:
+            for proc in alive:
+                try:
+                    proc.kill()
+                except Exception as e:
+                    logger.debug(f"Error killing child: {e}")
+            _wait_pid_event_driven(alive, timeout=1)
+    
     def restart(self, directory: str, command: str, frontend_directory: Optional[str] = None, frontend_command: Optional[str] = None):
         """Restart the server"""
         logger.info(f"Restarting server: directory={directory}")
@@ -284,10 +554,10 @@ class ServerManager:
             logger.error("Failed to stop server for restart")
             return stop_result
         
-        # Small delay to ensure cleanup
-        import time
-        logger.debug("Waiting 1 second for cleanup...")
-        time.sleep(1)
+        # stop() returns once the old backend and frontend trees have exited, so no fixed
+        # cleanup delay is needed; Windows gets a moment to release handles/ports
+        if os.name == "nt":
+            time.sleep(0.1)
         
         return self.start(directory, command, frontend_directory, frontend_command)
     
@@ -298,21 +568,20 @@ class ServerManager:
         # If we have a process reference, check if it's actually running
         if self.process:
             try:
-                proc = psutil.Process(self.process.pid)
-                if proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE:
-                    uptime = datetime.now().timestamp() - proc.create_time()
+                # Popen.poll() is a single non-blocking waitpid (it also reaps an exited process),
+                # so no /proc reads per dashboard poll; uptime comes from our own spawn time
+                if self.process.poll() is None:
+                    uptime = time.monotonic() - self._started_at if self._started_at else 0
                     self.is_running = True  # Sync flag with reality
                     status = {
                         "running": True,
                         "pid": self.process.pid,
                         "uptime": int(uptime)
                     }
-                    logger.debug(f"Server status: {status}")
+                    logger.debug("Server status: %s", status)
                     return status
-            except psutil.NoSuchProcess:
-                logger.debug("Process not found")
             except Exception as e:
-                logger.debug(f"Error checking process: {e}")
+                logger.debug("Error checking process: %s", e)
         
         # No process or process not running
         logger.debug("Server is not running")
@@ -325,14 +594,19 @@ class ServerManager:
     
     def get_recent_logs(self, count: int = 50):
         """Get recent log entries"""
-        logger.debug(f"Getting recent {count} logs")
-        
-        # Deque allows direct conversion to list
-        # It's thread-safe enough for this purpose (snapshot)
-        all_logs = list(self.log_queue)
+        logger.debug("Getting recent %d logs", count)
         
-        result = all_logs[-count:] if all_logs else []
-        logger.debug(f"Returning {len(result)} log entries")
+        # Walk back from the newest entry: O(count), not a copy of the whole deque. The dispatcher
+        # thread may append meanwhile, which invalidates the iterator; then fall back to a
+        # snapshot (list() copies a deque in one step under the GIL).
+        count = max(0, count)
+        try:
+            result = list(islice(reversed(self.log_queue), count))
+        except RuntimeError:
+            result = list(self.log_queue)[-count:] if count else []
+            result.reverse()
+        result.reverse()  # oldest first, as before
+        logger.debug("Returning %d log entries", len(result))
         return result
 
     def scan_project(self, root_path: str):
@@ -359,24 +633,25 @@ class ServerManager:
         
         found_backend = False
         found_frontend = False
+        # Shallowest directory with a requirements.txt, used if no entry point is found (BFS: first seen)
+        fallback_backend = None
 
         try:
-            for root, dirs, files in os.walk(root_path):
-                # Calculate depth to limit search
-                depth = root[len(root_path):].count(os.sep)
-                if depth > 2:
-                    continue
-                
-                # skip node_modules, venv, .git
-                if 'node_modules' in root or 'venv' in root or '.git' in root or '__pycache__' in root:
-                    continue
+            for root, entries in _scan_dirs(root_path, SCAN_MAX_DEPTH):
+                # One scandir per directory: DirEntry type checks come from the listing, not extra stats
+                files = {name for name, entry in entries.items() if entry.is_file()}
                 
-                logger.debug(f"Scanning {root}, files: {files[:10]}...")  # Log first 10 files
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Scanning {root}, files: {sorted(files)[:10]}...")  # Log first 10 files
 
                 # --- Backend Detection ---
                 if not found_backend:
+                    if fallback_backend is None and 'requirements.txt' in files:
+                        fallback_backend = root
+                    
                     # Check for venv in this directory
-                    has_venv = os.path.exists(os.path.join(root, 'venv', 'Scripts', 'activate.bat'))
+                    venv = entries.get('venv')
+                    has_venv = bool(venv and venv.is_dir() and os.path.isfile(os.path.join(venv.path, 'Scripts', 'activate.bat')))
                     venv_prefix = r'.\\venv\\Scripts\\activate && ' if has_venv else ''
                     
                     # Priority 1: launcher.py (Chattermax style)
@@ -420,21 +695,20 @@ class ServerManager:
                     elif 'package.json' in files:
                         # Check if it has 'dev' or 'start' script
                         try:
-                            import json
-                            with open(os.path.join(root, 'package.json'), 'r') as f:
-                                pkg = json.load(f)
-                                scripts = pkg.get('scripts', {})
-                                
-                                if 'dev' in scripts:
-                                    config['frontend_directory'] = root
-                                    config['frontend_command'] = 'npm run dev'
-                                    found_frontend = True
-                                    logger.info(f"Found Frontend (npm run dev) at {root}")
-                                elif 'start' in scripts:
-                                    config['frontend_directory'] = root
-                                    config['frontend_command'] = 'npm start'
-                                    found_frontend = True
-                                    logger.info(f"Found Frontend (npm start) at {root}")
+                            with open(entries['package.json'].path, 'rb') as f:
+                                pkg = _loads_json(f.read())
+                            scripts = pkg.get('scripts', {})
+                            
+                            if 'dev' in scripts:
+                                config['frontend_directory'] = root
+                                config['frontend_command'] = 'npm run dev'
+                                found_frontend = True
+                                logger.info(f"Found Frontend (npm run dev) at {root}")
+                            elif 'start' in scripts:
+                                config['frontend_directory'] = root
+                                config['frontend_command'] = 'npm start'
+                                found_frontend = True
+                                logger.info(f"Found Frontend (npm start) at {root}")
                         except Exception as e:
                             logger.warning(f"Failed to read package.json at {root}: {e}")
 
@@ -442,14 +716,11 @@ class ServerManager:
                     break
             
             # If nothing specific found, check for requirements.txt as fallback for backend
-            if not found_backend:
-                 for root, dirs, files in os.walk(root_path):
-                    if 'requirements.txt' in files and 'node_modules' not in root:
-                        config['directory'] = root
-                        config['command'] = 'python app.py' # generic fallback
-                        found_backend = True
-                        logger.info(f"Found Backend (requirements.txt match) at {root}")
-                        break
+            if not found_backend and fallback_backend:
+                config['directory'] = fallback_backend
+                config['command'] = 'python app.py' # generic fallback
+                found_backend = True
+                logger.info(f"Found Backend (requirements.txt match) at {fallback_backend}")
 
             return config
 
@@ -1,18 +1,26 @@
 """
 Traffic Monitor - Tracks HTTP requests to BackendBuddy API
 """
-from dataclasses import dataclass, asdict
-from datetime import datetime
+from dataclasses import dataclass
 from collections import deque
-from typing import List, Dict, Optional, Callable
+from itertools import islice
+from operator import itemgetter
+from typing import List, Dict, Optional, Callable, Tuple
+import sys
 import threading
 import time
 import logging
 
 logger = logging.getLogger("BackendBuddy.TrafficMonitor")
 
+# Seconds of history behind requests_per_second
+RPS_WINDOW = 60
 
-@dataclass
+# Slotted instances (no per-object __dict__) where dataclasses support it (3.10+)
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class RequestLog:
     """Single request record"""
     timestamp: str
@@ -26,10 +34,21 @@ class RequestLog:
     bytes_out: int
     
     def to_dict(self):
-        return asdict(self)
+        # Flat fields only: a literal is much cheaper than asdict()'s recursive copy
+        return {
+            "timestamp": self.timestamp,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "latency_ms": self.latency_ms,
+            "client_ip": self.client_ip,
+            "user_agent": self.user_agent,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
 
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class TrafficMetrics:
     """Aggregated traffic statistics"""
     total_requests: int
@@ -42,17 +61,41 @@ class TrafficMetrics:
     uptime_seconds: int
     
     def to_dict(self):
-        return asdict(self)
+        return {
+            "total_requests": self.total_requests,
+            "requests_per_second": self.requests_per_second,
+            "avg_latency_ms": self.avg_latency_ms,
+            "error_rate": self.error_rate,
+            "bytes_in_total": self.bytes_in_total,
+            "bytes_out_total": self.bytes_out_total,
+            "active_connections": self.active_connections,
+            "uptime_seconds": self.uptime_seconds
+        }
+
+
+@dataclass(**_DATACLASS_SLOTS)
+class EndpointStats:
+    """Running totals for one "METHOD path" endpoint"""
+    method: str
+    path: str
+    count: int = 0
+    errors: int = 0
+    total_latency: float = 0.0
 
 
 class TrafficMonitor:
     """In-memory traffic tracking with real-time streaming"""
     
+    __slots__ = ("max_history", "request_history", "endpoint_stats", "callbacks", "start_time",
+                 "total_requests", "total_errors", "total_latency_ms", "bytes_in_total",
+                 "bytes_out_total", "_rps_buckets", "_rps_last_sec", "_iso_cache", "_lock")
+    
     def __init__(self, max_history: int = 500):
         self.max_history = max_history
         self.request_history: deque = deque(maxlen=max_history)
-        self.endpoint_stats: Dict[str, Dict] = {}
-        self.callbacks: List[Callable] = []
+        self.endpoint_stats: Dict[str, EndpointStats] = {}
+        # Immutable snapshot, replaced on add/remove, so log_request iterates it without copying or locking
+        self.callbacks: Tuple[Callable, ...] = ()
         self._lock = threading.Lock()
         
         # Metrics tracking
@@ -63,8 +106,12 @@ class TrafficMonitor:
         self.bytes_out_total = 0
         self.start_time = time.time()
         
-        # For requests/sec calculation
-        self.recent_timestamps: deque = deque(maxlen=100)
+        # For requests/sec: request counts per second over the last RPS_WINDOW seconds (ring buffer)
+        self._rps_buckets: List[int] = [0] * RPS_WINDOW
+        self._rps_last_sec = int(time.time())
+        
+        # (whole second, "YYYY-MM-DDTHH:MM:SS") - the date/time part only changes once a second
+        self._iso_cache: Tuple[int, str] = (0, "")
         
         logger.info("TrafficMonitor initialized")
     
@@ -80,10 +127,14 @@ class TrafficMonitor:
         bytes_out: int = 0
     ):
         """Log a completed request"""
-        now = datetime.now()
+        now = time.time()
+        second = int(now)
+        if second != self._iso_cache[0]:
+            self._iso_cache = (second, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(second)))
         
         log_entry = RequestLog(
-            timestamp=now.isoformat(),
+            # Local time, same shape as datetime.now().isoformat()
+            timestamp=f"{self._iso_cache[1]}.{int((now - second) * 1_000_000):06d}",
             method=method,
             path=path,
             status=status,
@@ -94,59 +145,69 @@ class TrafficMonitor:
             bytes_out=bytes_out
         )
         
+        q = path.find('?')  # no throwaway list; ASGI paths normally carry no query string at all
+        endpoint_path = path if q < 0 else path[:q]
+        endpoint_key = f"{method} {endpoint_path}"
+        is_error = status >= 400
+        
+        # The lock only guards what readers iterate (history, timestamps, the endpoint dict's keys)
         with self._lock:
-            # Add to history
             self.request_history.append(log_entry)
-            
-            # Update totals
-            self.total_requests += 1
-            self.total_latency_ms += latency_ms
-            self.bytes_in_total += bytes_in
-            self.bytes_out_total += bytes_out
-            
-            if status >= 400:
-                self.total_errors += 1
-            
-            # Track for requests/sec
-            self.recent_timestamps.append(now.timestamp())
-            
-            # Update endpoint stats
-            endpoint_key = f"{method} {path.split('?')[0]}"
-            if endpoint_key not in self.endpoint_stats:
-                self.endpoint_stats[endpoint_key] = {
-                    "count": 0,
-                    "errors": 0,
-                    "total_latency": 0.0,
-                    "method": method,
-                    "path": path.split('?')[0]
-                }
-            
-            stats = self.endpoint_stats[endpoint_key]
-            stats["count"] += 1
-            stats["total_latency"] += latency_ms
-            if status >= 400:
-                stats["errors"] += 1
+            self._advance_rps(second)
+            self._rps_buckets[second % RPS_WINDOW] += 1
+            stats = self.endpoint_stats.get(endpoint_key)
+            if stats is None:
+                stats = self.endpoint_stats[endpoint_key] = EndpointStats(method=method, path=endpoint_path)
+        
+        # Counters are updated outside the lock: log_request has a single writer (the traffic
+        # drain task), readers only read them, so totals are best-effort consistent snapshots
+        self.total_requests += 1
+        self.total_latency_ms += latency_ms
+        self.bytes_in_total += bytes_in
+        self.bytes_out_total += bytes_out
+        stats.count += 1
+        stats.total_latency += latency_ms
+        if is_error:
+            self.total_errors += 1
+            stats.errors += 1
         
-        # Notify callbacks (for WebSocket streaming)
-        for callback in self.callbacks:
+        # Notify callbacks (for WebSocket streaming); the payload is built once and shared
+        callbacks = self.callbacks
+        if not callbacks:
+            return
+        payload = log_entry.to_dict()
+        for callback in callbacks:
             try:
-                callback(log_entry.to_dict())
+                callback(payload)
             except Exception as e:
                 logger.error(f"Callback error: {e}")
     
+    def _advance_rps(self, second: int):
+        """Zero the buckets of seconds that passed since the last update (call with the lock held)"""
+        elapsed = second - self._rps_last_sec
+        if elapsed <= 0:
+            return
+        if elapsed >= RPS_WINDOW:
+            self._rps_buckets = [0] * RPS_WINDOW
+        else:
+            for s in range(self._rps_last_sec + 1, second + 1):
+                self._rps_buckets[s % RPS_WINDOW] = 0
+        self._rps_last_sec = second
+    
     def get_recent_requests(self, count: int = 50) -> List[Dict]:
-        """Get recent request history"""
+        """Get recent request history, newest first"""
         with self._lock:
-            items = list(self.request_history)[-count:]
-            return [r.to_dict() for r in reversed(items)]
+            # Walk back from the newest entry: O(count), not a copy of the whole history
+            items = list(islice(reversed(self.request_history), max(0, count)))
+        return [r.to_dict() for r in items]
     
     def get_metrics(self, active_connections: int = 0) -> Dict:
         """Get aggregated traffic metrics"""
         with self._lock:
             # Calculate requests per second
             now = time.time()
-            recent = [t for t in self.recent_timestamps if now - t < 60]
-            rps = len(recent) / 60.0 if recent else 0.0
+            self._advance_rps(int(now))
+            rps = sum(self._rps_buckets) / float(RPS_WINDOW)
             
             # Calculate averages
             avg_latency = (
@@ -171,39 +232,38 @@ class TrafficMonitor:
     
     def get_endpoint_stats(self) -> List[Dict]:
         """Get per-endpoint breakdown"""
+        # Snapshot (key, count, errors, latency) under the lock; the per-row math runs without it
         with self._lock:
-            result = []
-            for key, stats in self.endpoint_stats.items():
-                avg_latency = (
-                    stats["total_latency"] / stats["count"] 
-                    if stats["count"] > 0 else 0.0
-                )
-                result.append({
-                    "endpoint": key,
-                    "method": stats["method"],
-                    "path": stats["path"],
-                    "count": stats["count"],
-                    "errors": stats["errors"],
-                    "avg_latency_ms": round(avg_latency, 2),
-                    "error_rate": round(
-                        (stats["errors"] / stats["count"]) * 100 
-                        if stats["count"] > 0 else 0.0, 
-                        2
-                    )
-                })
-            
-            # Sort by count descending
-            result.sort(key=lambda x: x["count"], reverse=True)
-            return result
+            rows = [
+                (key, stats.method, stats.path, stats.count, stats.errors, stats.total_latency)
+                for key, stats in self.endpoint_stats.items()
+            ]
+        
+        # Sort by count descending
+        rows.sort(key=itemgetter(3), reverse=True)
+        return [
+            {
+                "endpoint": key,
+                "method": method,
+                "path": path,
+                "count": count,
+                "errors": errors,
+                "avg_latency_ms": round(total_latency / count, 2) if count > 0 else 0.0,
+                "error_rate": round(errors * 100 / count, 2) if count > 0 else 0.0
+            }
+            for key, method, path, count, errors, total_latency in rows
+        ]
     
     def add_callback(self, callback: Callable):
         """Add real-time update callback"""
-        self.callbacks.append(callback)
+        # Copy-on-write: readers grab the tuple without locking; the lock only orders concurrent writers
+        with self._lock:
+            self.callbacks = self.callbacks + (callback,)
     
     def remove_callback(self, callback: Callable):
         """Remove callback"""
-        if callback in self.callbacks:
-            self.callbacks.remove(callback)
+        with self._lock:
+            self.callbacks = tuple(cb for cb in self.callbacks if cb is not callback)
     
     def clear(self):
         """Clear all data"""
@@ -215,7 +275,7 @@ class TrafficMonitor:
             self.total_latency_ms = 0.0
             self.bytes_in_total = 0
             self.bytes_out_total = 0
-            self.recent_timestamps.clear()
+            self._rps_buckets = [0] * RPS_WINDOW
             self.start_time = time.time()
         logger.info("TrafficMonitor cleared")
 
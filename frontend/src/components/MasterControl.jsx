@@ -63,8 +63,14 @@ export default function MasterControl({ apiUrl }) {
 
             if (config.ngrok_enabled) {
                 addMessage('Starting ngrok tunnel...')
-                await axios.post(`${apiUrl}/api/ngrok`, { action: 'start' })
-                addMessage('✓ ngrok connected')
+                const ngrokRes = await axios.post(`${apiUrl}/api/ngrok`, { action: 'start' })
+                if (!ngrokRes.data.success) {
+                    addMessage(`✗ ngrok failed: ${ngrokRes.data.message}`)
+                } else if (ngrokRes.data.status === 'starting') {
+                    addMessage('ngrok starting, the link appears once the tunnel is up')
+                } else {
+                    addMessage('✓ ngrok connected')
+                }
             }
 
             if (config.cloudflare_enabled) {
@@ -27,7 +27,9 @@ export default function ServerControl({ apiUrl }) {
         const ws = new WebSocket(`ws://${wsHost}/ws/logs`)
 
         ws.onmessage = (event) => {
-            setLogs(prev => [...prev.slice(-200), event.data])
+            // The backend coalesces bursts of log lines into one newline-joined frame
+            const lines = event.data.split('\n')
+            setLogs(prev => [...prev, ...lines].slice(-201))
         }
 
         wsRef.current = ws